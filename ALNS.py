@@ -1,22 +1,26 @@
+import concurrent.futures
+import itertools
 import logging
+import queue
 import time
+from collections import namedtuple
 
+import numpy as np
 import pandas as pd
-import random
 import datetime
-import tkinter as tk
-
-from matplotlib import pyplot as plt
 
 from logs import Log
 import math
 from ALNS_methods import Method, update_method_probability
-from ortools.linear_solver import pywraplp
 import os
 
 import ALNS_tools
 import constants
-from shapes import Shape
+import knapsack
+import checkpoint
+import layout_cache
+from snapshot import LayoutSnapshot
+from shapes import Shape, ShapeType, get_next_shape_id, set_next_shape_id
 
 date = datetime.date.today()
 logging.basicConfig(level=logging.DEBUG, filename=os.path.join(os.getcwd(), 'logs/saw_mill_app' + str(date) + '.log'),
@@ -28,7 +32,47 @@ logging.getLogger("PIL.PngImagePlugin").setLevel(logging.WARNING)
 logger.setLevel(logging.DEBUG)
 
 
-def run_ALNS(logs: list, shape_types: list, root: tk.Tk, progress_label: tk.Label):
+def run_ALNS(logs: list, shape_types: list, root=None, progress_label=None, workers: int = None,
+             islands: int = None, progress_queue: queue.Queue = None, snapshot: LayoutSnapshot = None,
+             resume: dict = None, seed: int or np.random.SeedSequence = None, final_state: dict = None):
+    """
+    :param logs: List of Logs with their initial solution
+    :param shape_types: List of Shape Types (Available sizes)
+    :param root: tkinter window kept responsive during the optimisation, None to run headless
+    :param progress_label: tkinter label showing the progress, None to run headless
+    :param workers: Number of processes to spread the logs over, constants.alns_workers by default
+    :param islands: Number of independent searches over all logs, constants.alns_islands by default
+    :param progress_queue: Queue receiving ("status", text) and ("progress", dict) events, at most once per
+                           constants.progress_event_interval seconds, for a GUI running in another thread
+    :param snapshot: Kept up to date with the best layouts so far, which can be read from another thread at any moment.
+                     The parallel modes only update it as their workers finish.
+    :param resume: Checkpoint (see checkpoint.load_checkpoint) to continue from, replacing the layouts of the logs.
+                   Every constants.checkpoint_interval iterations a checkpoint is written to constants.checkpoint_path,
+                   only in the single process mode.
+    :param seed: Seed of the random number generator of the search, constants.random_seed by default. Parallel workers
+                 and islands draw from independent streams spawned from it.
+    :param final_state: Filled with a checkpoint of the search once it has stopped, which continues the search when it
+                        is passed as resume. Only in the single process mode.
+    :return: Dataframes of the solution quality, method statistics and parameters per iteration
+    """
+    if workers is None:
+        workers = constants.alns_workers
+    if islands is None:
+        islands = constants.alns_islands
+    if seed is None:
+        seed = constants.random_seed
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    # The entropy is drawn from the OS without a seed, logging it allows repeating the run
+    logger.info(f"Random seed {seed_sequence.entropy}, spawn key {seed_sequence.spawn_key}")
+    if resume is not None and (islands > 1 or workers > 1):
+        raise ValueError("A checkpoint can only be resumed by a single process search")
+    if islands > 1:
+        return run_ALNS_islands(logs, shape_types, root, progress_label, islands, progress_queue, snapshot,
+                                seed_sequence)
+    if workers > 1 and len(logs) > 1:
+        return run_ALNS_parallel(logs, shape_types, root, progress_label, workers, progress_queue, snapshot,
+                                 seed_sequence)
+    rng = np.random.default_rng(seed_sequence)
 
     solution_quality_df = pd.DataFrame(columns=["iteration", "log", "score", "saw_dust", "volume_used", "efficiency"])
     method_df = pd.DataFrame(columns=["iteration", "method", "probability",
@@ -55,70 +99,113 @@ def run_ALNS(logs: list, shape_types: list, root: tk.Tk, progress_label: tk.Labe
                        Method(name="SUBSPACE", goal="destroy")]
     repair_methods = [Method(name="RPE", goal="repair"),
                       Method(name="SER", goal="repair"),
-                      Method(name="BER", goal="repair")]
+                      Method(name="BER", goal="repair"),
+                      Method(name="GUILLOTINE", goal="repair")]
     tuck_methods = [Method(name="TUCK-CENTRE", goal="other"),
                     Method(name="TUCK-LEFT", goal="other"),
                     Method(name="TUCK-RIGHT", goal="other"),
                     Method(name="TUCK-UP", goal="other"),
                     Method(name="TUCK-DOWN", goal="other")]
     tuck_probabilities = [0.8, 0.05, 0.05, 0.05, 0.05]
+    last_progress_event = -math.inf
+    t_start = time.perf_counter()
+    iterations_without_improvement = 0
+
+    def search_state() -> dict:
+        return {"iteration": iteration, "temperature": temperature, "destroy_degree": destroy_degree,
+                "repair_degree": repair_degree, "tuck_degree": tuck_degree,
+                "methods": (destroy_methods, repair_methods, tuck_methods),
+                "dataframes": (solution_quality_df, method_df, parameter_df),
+                "iterations_without_improvement": iterations_without_improvement, "rng": rng,
+                "elapsed": time.perf_counter() - t_start}
+
+    if resume is not None:
+        state = checkpoint.restore_checkpoint(resume, logs, shape_types)
+        iteration, temperature = state["iteration"], state["temperature"]
+        destroy_degree, repair_degree = state["destroy_degree"], state["repair_degree"]
+        tuck_degree = state["tuck_degree"]
+        destroy_methods, repair_methods, tuck_methods = state["methods"]
+        solution_quality_df, method_df, parameter_df = state["dataframes"]
+        iterations_without_improvement = state["iterations_without_improvement"]
+        rng = state["rng"]
+        # The time limit covers the time spent before the checkpoint as well
+        t_start -= state["elapsed"]
+        logger.info(f"Resuming from checkpoint at iteration {iteration} with temperature {temperature}")
+    else:
+        # From here on the scores are only updated by the score delta of every candidate
+        ALNS_tools.update_log_scores(logs)
+    stop_reason = "temperature or maximum number of iterations reached"
+    if snapshot is not None:
+        snapshot.update(logs, iteration)
 
     """
     Start ALNS Sequence, select random methods to repair and destroy based on assigned probabilities
     """
     while temperature > 1 and iteration <= constants.max_iterations * len(logs):
         t_0 = time.perf_counter()
-        progress_label.config(text=constants.optimising_text + f"Iteration {iteration} out of "
-                                                               f"{constants.max_iterations * len(logs)}")
-        root.update()
-        log = ALNS_tools.select_log(logs)
+        reason = ALNS_tools.check_stopping_rules(logs, t_start, iterations_without_improvement)
+        if reason is not None:
+            stop_reason = reason
+            break
+        if progress_label is not None:
+            progress_label.config(text=constants.optimising_text + f"Iteration {iteration} out of "
+                                                                   f"{constants.max_iterations * len(logs)}")
+        if root is not None:
+            root.update()
+        if progress_queue is not None and t_0 - last_progress_event >= constants.progress_event_interval:
+            last_progress_event = t_0
+            progress_queue.put(("progress", {"iteration": iteration,
+                                             "iterations": constants.max_iterations * len(logs),
+                                             "temperature": temperature,
+                                             "efficiency": {log.log_id: log.efficiency for log in logs}}))
+        # Logs that reached the target efficiency are no longer optimised
+        log = ALNS_tools.select_log([log for log in logs if constants.target_efficiency <= 0
+                                     or log.efficiency < constants.target_efficiency], rng)
         logger.debug(f"\n\nGoing into iteration {iteration} with temperature {temperature}... "
                      f"Selected {log.log_id} with diameter {log.diameter}")
-        # Invoke copy here to ensure changes do not apply unless new solution is accepted
-        log_new = Log(diameter=log.diameter, saw_kerf=log.saw_kerf, copy_id=log.log_id)
-        for shape in log.shapes:
-            Shape(shape_type=shape.type, x=shape.x, y=shape.y, copy_id=shape.shape_id).assign_to_log(log_new)
+        # Journal all changes to ensure changes do not apply unless new solution is accepted
+        old_score = log.score
+        log.begin_transaction()
 
         # Only run repair methods for the first couple of iterations to fill up empty space in initial solution
         if iteration < constants.fill_up_iterations * len(logs):
             for i in range(math.floor(repair_degree)):
-                repair_method = random.choices(repair_methods,
-                                               weights=[method.probability for method in repair_methods],
-                                               k=1)[0]
+                repair_method = ALNS_tools.select_weighted(repair_methods,
+                                                           [method.probability for method in repair_methods], rng)
                 logger.debug(f"Select repair method {repair_method.name} with probability {repair_method.probability}")
-                repair_method.execute(log_new, shape_types)
+                repair_method.execute(log, shape_types, rng)
 
-            tuck_method = random.choices(tuck_methods, weights=tuck_probabilities, k=1)[0]
-            tuck_method.execute(log_new, shape_types)
+            tuck_method = ALNS_tools.select_weighted(tuck_methods, tuck_probabilities, rng)
+            tuck_method.execute(log, shape_types, rng)
         else:
-            tuck_timing = random.choices(["start", "inbetween", "end"],
-                                         weights=[tuck_start_prob, tuck_between_prob, tuck_end_prob], k=1)[0]
+            tuck_timing = ALNS_tools.select_weighted(["start", "inbetween", "end"],
+                                                     [tuck_start_prob, tuck_between_prob, tuck_end_prob], rng)
 
             if tuck_timing == "start":
                 for _ in range(math.floor(tuck_degree)):
-                    tuck_method = random.choices(tuck_methods, weights=tuck_probabilities, k=1)[0]
-                    tuck_method.execute(log_new, shape_types)
+                    tuck_method = ALNS_tools.select_weighted(tuck_methods, tuck_probabilities, rng)
+                    tuck_method.execute(log, shape_types, rng)
 
             for i in range(math.floor(destroy_degree)):
-                destroy_method = random.choices(destroy_methods,
-                                                weights=[method.probability for method in destroy_methods], k=1)[0]
+                destroy_method = ALNS_tools.select_weighted(destroy_methods,
+                                                            [method.probability for method in destroy_methods], rng)
                 logger.debug(f"Select destroy method {destroy_method.name} "
                              f"with probability {destroy_method.probability}")
-                destroy_method.execute(log_new, shape_types)
+                destroy_method.execute(log, shape_types, rng)
 
             if tuck_timing == "inbetween":
                 for _ in range(math.floor(tuck_degree)):
-                    tuck_method = random.choices(tuck_methods, weights=tuck_probabilities, k=1)[0]
-                    tuck_method.execute(log_new, shape_types)
+                    tuck_method = ALNS_tools.select_weighted(tuck_methods, tuck_probabilities, rng)
+                    tuck_method.execute(log, shape_types, rng)
 
             repairs = 0
             repair_iterations = 0
             while repairs <= math.floor(repair_degree):
                 repair_iterations += 1
-                repair_method = random.choices(repair_methods,
-                                               weights=[method.probability for method in repair_methods], k=1)[0]
+                repair_method = ALNS_tools.select_weighted(repair_methods,
+                                                           [method.probability for method in repair_methods], rng)
                 logger.debug(f"Select repair method {repair_method.name} with probability {repair_method.probability}")
-                method_was_successful = repair_method.execute(log_new, shape_types)
+                method_was_successful = repair_method.execute(log, shape_types, rng)
                 if method_was_successful:
                     logger.debug(f"Repair method {repair_method.name} was successful")
                     repairs += 1
@@ -132,43 +219,47 @@ def run_ALNS(logs: list, shape_types: list, root: tk.Tk, progress_label: tk.Labe
 
             if tuck_timing == "end":
                 for _ in range(math.floor(tuck_degree)):
-                    tuck_method = random.choices(tuck_methods, weights=tuck_probabilities, k=1)[0]
-                    tuck_method.execute(log_new, shape_types)
+                    tuck_method = ALNS_tools.select_weighted(tuck_methods, tuck_probabilities, rng)
+                    tuck_method.execute(log, shape_types, rng)
 
-            # FEASIBILITY CHECK AFTER EACH ITERATION - THIS IS ONLY FOR DEBUGGING AND AFFECTS PERFORMANCE
-            # if not ALNS_tools.check_feasibility(logs):
-            #     raise ValueError(f"Placement not feasible")
+        # Only the changed shapes are evaluated, the full score is only recomputed to verify it
+        log.score = old_score + ALNS_tools.calculate_score_delta(log, log.get_changes())
+        if constants.score_check_interval > 0 and iteration % constants.score_check_interval == 0:
+            ALNS_tools.verify_log_score(log, iteration)
+        accept_new_solution, delta, score = ALNS_tools.check_if_new_score_better(old_score, log.score, temperature)
 
-        ALNS_tools.update_log_scores([log_new])
-        accept_new_solution, delta, score = ALNS_tools.check_if_new_solution_better(log, log_new, temperature)
+        # Verify the layout before accepting it, an infeasible candidate is rolled back like a rejected one
+        if accept_new_solution and constants.feasibility_check_interval > 0 \
+                and iteration % constants.feasibility_check_interval == 0 and not log.check_if_feasible():
+            logger.critical(f"Placement not feasible in log {log.log_id} at iteration {iteration}, rejecting it")
+            accept_new_solution = False
 
         """
         Single Iteration completed, process changes and update parameter values
         """
         if accept_new_solution:
             # Remove this part - Save plot for each iteration (VERY MEMORY INTENSIVE, ONLY FOR TESTING)
-            # log_new.show_plot()
-            # log_new.fig.savefig(f"plots/log_{log.log_id}_iteration_{iteration}_accepted.png")
-            # plt.close(log_new.fig)
+            # log.show_plot()
+            # log.fig.savefig(f"plots/log_{log.log_id}_iteration_{iteration}_accepted.png")
+            # plt.close(log.fig)
 
             logger.debug(f"New solution has been accepted with improvement {delta}")
-            log.shapes = log_new.shapes
-            for shape in log.shapes:
-                shape.log = log
-            log.score = log_new.score
-            log.volume_used = log_new.volume_used
-            log.calculate_efficiency()
-            log.saw_dust = log_new.saw_dust
+            log.commit_transaction()
             log.selection_weight = log.selection_weight * constants.log_selection_accepted
-            del log_new
+            iterations_without_improvement = 0
+            if snapshot is not None:
+                snapshot.update([log], iteration)
         else:
             # Remove this part - Save plot for each iteration (VERY MEMORY INTENSIVE, ONLY FOR TESTING)
-            # log_new.show_plot()
-            # log_new.fig.savefig(f"plots/log_{log.log_id}_iteration_{iteration}_rejected.png")
-            # plt.close(log_new.fig)
+            # log.show_plot()
+            # log.fig.savefig(f"plots/log_{log.log_id}_iteration_{iteration}_rejected.png")
+            # plt.close(log.fig)
 
             logger.debug(f"New solution has been rejected, delta of {delta}")
+            log.rollback_transaction()
+            log.score = old_score
             log.selection_weight = log.selection_weight * constants.log_selection_rejected
+            iterations_without_improvement += 1
 
         temperature = ALNS_tools.update_temperature(temperature, accept_new_solution, delta, score)
         destroy_degree, repair_degree = ALNS_tools.update_degrees(temperature, accept_new_solution,
@@ -194,215 +285,470 @@ def run_ALNS(logs: list, shape_types: list, root: tk.Tk, progress_label: tk.Labe
                               f"and performance {method.performance}")
             for log in logs:
                 logging.debug(f"Log {log.log_id} has weight {log.selection_weight}")
+        if constants.checkpoint_interval > 0 and (iteration - 1) % constants.checkpoint_interval == 0:
+            # Rebuild the logs like a resumed search does, such that a resumed search continues exactly like this one
+            for log in logs:
+                log.set_shapes(list(log.shapes))
+            checkpoint.save_checkpoint(constants.checkpoint_path,
+                                       checkpoint.create_checkpoint(logs, shape_types, search_state()))
         t_1 = time.perf_counter()
         logger.debug(f"Iteration {iteration} - Time required {(t_1 - t_0)/60 :.2f}")
 
+    logger.info(f"Stopped search after {iteration - 1} iterations in {time.perf_counter() - t_start:.1f}s: "
+                f"{stop_reason}")
+
     # Push shapes to centre at end
     for log in logs:
         for _ in range(constants.centring_attempts):
-            tuck_methods[0].execute(log, shape_types)
+            tuck_methods[0].execute(log, shape_types, rng)
+    ALNS_tools.update_log_scores(logs)
+    if final_state is not None:
+        final_state.update(checkpoint.create_checkpoint(logs, shape_types, search_state()))
+    if snapshot is not None:
+        snapshot.update(logs, iteration)
+        snapshot.stop_reason = stop_reason
     ALNS_tools.report_method_stats(repair_methods + destroy_methods + tuck_methods)
+    logger.info(f"Knapsack cache: {knapsack.table_cache}, greedy fallbacks: {knapsack.fallbacks}")
 
     return solution_quality_df, method_df, parameter_df
 
 
-def greedy_place(all_shapes: list, shape_types: list, logs: list) -> None:
+def run_ALNS_parallel(logs: list, shape_types: list, root, progress_label, workers: int,
+                      progress_queue: queue.Queue = None, snapshot: LayoutSnapshot = None,
+                      seed_sequence: np.random.SeedSequence = None):
+    """
+    Runs an independent ALNS for every group of logs in a worker process, each with its own temperature and method
+    probabilities. Logs are assigned largest first to the group with the smallest total volume.
+    The shapes of the final layouts get new ids in this process (see renumber_shapes), as the workers number the
+    shapes they create independently. The final layouts replace those of the logs. The statistics of all workers are
+    merged per iteration.
+    Every worker draws from its own random stream, spawned from seed_sequence.
+    """
+    groups = [[] for _ in range(min(workers, len(logs)))]
+    for log in sorted(logs, key=lambda log: log.volume, reverse=True):
+        min(groups, key=lambda group: sum([member.volume for member in group])).append(log)
+
+    if progress_label is not None:
+        progress_label.config(text=constants.optimising_text + f"{len(logs)} logs in {len(groups)} processes")
+    if progress_queue is not None:
+        progress_queue.put(("status", f"{len(logs)} logs in {len(groups)} processes"))
+    if root is not None:
+        root.update()
+
+    type_descriptors = [shape_type.to_descriptor() for shape_type in shape_types]
+    first_shape_id = get_next_shape_id()
+    if seed_sequence is None:
+        seed_sequence = np.random.SeedSequence(constants.random_seed)
+    seed_sequences = seed_sequence.spawn(len(groups))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=len(groups)) as executor:
+        futures = [executor.submit(run_ALNS_from_descriptors,
+                                   [log.to_descriptor() for log in group],
+                                   type_descriptors,
+                                   constants_snapshot(),
+                                   first_shape_id,
+                                   seed_sequences[index])
+                   for index, group in enumerate(groups)]
+        # Keep the window responsive while the workers run
+        while len(concurrent.futures.wait(futures, timeout=0.1).not_done) > 0:
+            if root is not None:
+                root.update()
+        results = [future.result() for future in futures]
+
+    for group, (log_descriptors, _, _, _, _) in zip(groups, results):
+        for log, log_descriptor in zip(group, log_descriptors):
+            log.set_shapes([Shape.from_descriptor(descriptor, shape_types)
+                            for descriptor in renumber_shapes(log_descriptor)[3]])
+    ALNS_tools.update_log_scores(logs)
+    if snapshot is not None:
+        snapshot.update(logs, max([len(result[3]) for result in results]))
+        snapshot.stop_reason = "all workers finished"
+
+    return merge_run_statistics(results)
+
+
+def run_ALNS_islands(logs: list, shape_types: list, root, progress_label, islands: int,
+                     progress_queue: queue.Queue = None, snapshot: LayoutSnapshot = None,
+                     seed_sequence: np.random.SeedSequence = None):
+    """
+    Multi-start search: every island runs its own ALNS on a copy of all logs in a worker process, with its own random
+    stream spawned from seed_sequence.
+    The search is split in constants.island_migration_epochs epochs of equal length. After every epoch the best layout
+    of each log found by any island replaces the worst one (migration). Every island continues its search in the next
+    epoch from its final state (see run_ALNS final_state), i.e. its iteration, degrees, method probabilities and log
+    selection weights carry over. Only the temperature restarts at the starting temperature, and the count of
+    iterations without improvement and the time of the epoch restart at 0. The logs get the best layout found.
+    """
+    epochs = max(constants.island_migration_epochs, 1)
+    iterations_per_epoch = math.ceil(constants.max_iterations / epochs)
+    epoch_constants = constants_snapshot()
+    epoch_constants["time_limit"] = constants.time_limit / epochs
+    type_descriptors = [shape_type.to_descriptor() for shape_type in shape_types]
+    if seed_sequence is None:
+        seed_sequence = np.random.SeedSequence(constants.random_seed)
+
+    seed_sequences = seed_sequence.spawn(islands)
+
+    layouts = [[log.to_descriptor() for log in logs] for _ in range(islands)]
+    states = [None] * islands
+    scores = []
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=islands) as executor:
+        for epoch in range(epochs):
+            if progress_label is not None:
+                progress_label.config(text=constants.optimising_text + f"Epoch {epoch + 1} out of {epochs} "
+                                                                       f"on {islands} islands")
+            if progress_queue is not None:
+                progress_queue.put(("status", f"Epoch {epoch + 1} out of {epochs} on {islands} islands"))
+            if root is not None:
+                root.update()
+
+            # All islands number their new shapes from above the ids of all shapes so far
+            epoch_constants["max_iterations"] = (epoch + 1) * iterations_per_epoch
+            first_shape_id = get_next_shape_id()
+            for state in states:
+                if state is not None:
+                    state["next_shape_id"] = first_shape_id
+                    state["search"].update(temperature=constants.starting_temperature,
+                                           iterations_without_improvement=0, elapsed=0)
+            futures = [executor.submit(run_ALNS_from_descriptors,
+                                       layouts[island],
+                                       type_descriptors,
+                                       epoch_constants,
+                                       first_shape_id,
+                                       seed_sequences[island],
+                                       states[island])
+                       for island in range(islands)]
+            while len(concurrent.futures.wait(futures, timeout=0.1).not_done) > 0:
+                if root is not None:
+                    root.update()
+
+            # The statistics of an island cover all epochs so far, as they are part of its state
+            results = [future.result() for future in futures]
+            states = [result[4] for result in results]
+            # The ids of the islands overlap, their layouts get new ids in this process
+            for state in states:
+                state["logs"] = [(renumber_shapes(descriptor), selection_weight, score)
+                                 for descriptor, selection_weight, score in state["logs"]]
+            layouts = [[descriptor for descriptor, _, _ in state["logs"]] for state in states]
+
+            # Migration of the elite layout of every log to the island holding the worst one
+            scores = [[ALNS_tools.calculate_log_score(Log.from_descriptor(descriptor, shape_types))
+                       for descriptor in layout] for layout in layouts]
+            elites = []
+            for index in range(len(logs)):
+                log_scores = [island_scores[index] for island_scores in scores]
+                best, worst = int(np.argmax(log_scores)), int(np.argmin(log_scores))
+                logger.debug(f"Epoch {epoch}: log {logs[index].log_id} scores {log_scores}, "
+                             f"migrating island {best} to island {worst}")
+                layouts[worst][index] = layouts[best][index]
+                states[worst]["logs"][index] = states[best]["logs"][index]
+                scores[worst][index] = scores[best][index]
+                elites.append(layouts[best][index])
+            if snapshot is not None:
+                snapshot.update([Log.from_descriptor(descriptor, shape_types) for descriptor in elites],
+                                max([state["search"]["iteration"] for state in states]) - 1)
+
+    # Every log gets a layout of its own, renumbered after the last epoch, hence the ids are unique over all logs
+    for index, log in enumerate(logs):
+        best = max(range(islands), key=lambda island: scores[island][index])
+        log.set_shapes([Shape.from_descriptor(descriptor, shape_types) for descriptor in layouts[best][index][3]])
+    ALNS_tools.update_log_scores(logs)
+    if snapshot is not None:
+        snapshot.stop_reason = f"{epochs} epochs finished"
+
+    return merge_run_statistics(results)
+
+
+def merge_run_statistics(results: list) -> tuple:
+    """
+    Merges the dataframes of several runs of run_ALNS per iteration: the solution quality of the run with the best
+    score for every log, the mean method probabilities with the total method counts, and the mean parameters
+    :param results: List of (log descriptors, solution_quality_df, method_df, parameter_df, ...), see
+                    run_ALNS_from_descriptors
+    :return: Merged solution_quality_df, method_df, parameter_df
+    """
+    solution_quality_df = pd.concat([result[1] for result in results], ignore_index=True)
+    solution_quality_df["score"] = solution_quality_df["score"].astype(float)
+    # Whole rows are taken, such that the sawdust and usage belong to the layout with the best score
+    solution_quality_df = solution_quality_df.loc[solution_quality_df.groupby(["iteration", "log"])["score"].idxmax()] \
+        .reset_index(drop=True)
+    method_df = pd.concat([result[2] for result in results], ignore_index=True) \
+        .groupby(["iteration", "method"], as_index=False) \
+        .agg({"probability": "mean", "times_called": "sum", "times_tried": "sum", "times_success": "sum"})
+    parameter_df = pd.concat([result[3] for result in results], ignore_index=True) \
+        .groupby("iteration", as_index=False).mean()
+    return solution_quality_df, method_df, parameter_df
+
+
+def renumber_shapes(log_descriptor: tuple) -> tuple:
+    """
+    Gives the shapes of a log descriptor new ids from the shape id counter of this process. Worker processes all start
+    numbering at the same id, hence the ids of their shapes are only unique within a worker.
+    :return: Log descriptor with renumbered shapes
+    """
+    log_id, diameter, saw_kerf, shape_descriptors = log_descriptor
+    first_shape_id = get_next_shape_id()
+    set_next_shape_id(first_shape_id + len(shape_descriptors))
+    return log_id, diameter, saw_kerf, tuple([(first_shape_id + index,) + tuple(descriptor[1:])
+                                               for index, descriptor in enumerate(shape_descriptors)])
+
+
+def run_ALNS_from_descriptors(log_descriptors: list, type_descriptors: list, constant_values: dict,
+                              first_shape_id: int, seed_sequence: np.random.SeedSequence,
+                              resume: dict = None) -> tuple:
+    """
+    Entry point of the run_ALNS worker processes
+    :param first_shape_id: First id of the shapes created in the worker, above the ids of all shapes in the logs
+    :param resume: Final state of an earlier run on these logs to continue from, see run_ALNS
+    :return: Descriptors of the optimised logs, the dataframes of run_ALNS and its final state
+    """
+    vars(constants).update(constant_values)
+    # Workers would overwrite each other's checkpoints
+    constants.checkpoint_interval = 0
+    set_next_shape_id(first_shape_id)
+    shape_types = [ShapeType.from_descriptor(descriptor) for descriptor in type_descriptors]
+    logs = [Log.from_descriptor(descriptor, shape_types) for descriptor in log_descriptors]
+    final_state = {}
+    solution_quality_df, method_df, parameter_df = run_ALNS(logs, shape_types, workers=1, islands=1,
+                                                            resume=resume, seed=seed_sequence, final_state=final_state)
+    return [log.to_descriptor() for log in logs], solution_quality_df, method_df, parameter_df, final_state
+
+
+class Placement(namedtuple("Placement", ["shape_type", "x", "y"])):
+    """
+    Location of a shape in an initial solution, the Shape itself is only created once the solution is registered.
+    """
+    __slots__ = ()
+
+    @property
+    def width(self) -> float:
+        return self.shape_type.width
+
+    @property
+    def height(self) -> float:
+        return self.shape_type.height
+
+
+def greedy_place(all_shapes: list, shape_types: list, logs: list, workers: int = None) -> None:
     """
     :param all_shapes: List of all Shapes
     :param shape_types: List of Shape Types (Available sizes)
     :param logs: List of Logs
+    :param workers: Number of processes to spread the logs over, constants.greedy_place_workers by default
     :return:
     """
+    if workers is None:
+        workers = constants.greedy_place_workers
 
-    for log in logs:
-        """
-        First we go over all shapes, we make a rectangle with that size, fill it up with similar pieces,
-        and then consider the utilisation rate of that rectangle.
-        """
-        solutions = []
-        logger.debug(f"Optimising for log with diameter {log.diameter}")
-        shapes = []
-
-        for shape in shape_types:
-
-            if shape.height >= log.diameter:
-                continue
-
-            w_bar, x_left, x_right = ALNS_tools.calculate_max_width_rect(height=shape.height, diameter=log.diameter)
-            rectangle_volume = w_bar * shape.height
-
-            """
-            ---OPTIMISING CENTRAL RECTANGLE---
-            Use shapes of same height or smaller to efficiently fill rectangle.
-            This will always include the original shape itself.
-            """
-            shorter_shapes = [shape_2 for shape_2 in shape_types
-                              if shape_2.height <= shape.height]
-
-            solver = pywraplp.Solver.CreateSolver('SAT')
-
-            # add decision variables
-            var_stage_1 = []
-            for short_shape in shorter_shapes:
-                var_stage_1.append([solver.IntVar(0, solver.infinity(), 'x' + str(short_shape.type_id)),
-                                    short_shape.width, short_shape.height, short_shape.type_id])
-
-            # add constraint for maximum length
-            solver.Add(sum([v[0] * (v[1] + log.saw_kerf)
-                            for v in var_stage_1]) <= w_bar)
-            solver.Maximize(sum([v[0] * v[1] * v[2] for v in var_stage_1]))
-
-            status = solver.Solve()
-
-            if status == pywraplp.Solver.OPTIMAL:
-                # print("\n Solution:")
-                # print("Obj Value = ", solver.Objective().Value())
-                stage_1_values = [[v[3], v[0].solution_value()] for v in var_stage_1]
-                usage_stage_1 = solver.Objective().Value()
-                # print(f"For height {shape.height}, found usage of {usage}.")
-            else:
-                raise ValueError("Solution Not Converged")
-
-            """
-            ---OPTIMISING NORTHERN/SOUTHERN RECTANGLE---
-            STAGE 2 OPTIMISATION
-            """
-            height_a = (log.diameter - (shape.height + 2 * log.saw_kerf)) / 2
-            stage_2_solutions = []
-            shorter_a_shapes = [shape_2 for shape_2 in shape_types if shape_2.height <= height_a]
-
-            for short_shape in shorter_a_shapes:
-                h_n = short_shape.height
-                r = log.diameter / 2
-                inner_value = r ** 2 - ((log.diameter + (shape.height + 2 * log.saw_kerf)) / 2 + h_n - r) ** 2
-
-                x_left_north = r - math.sqrt(inner_value)
-                x_right_north = r + math.sqrt(inner_value)
-
-                width_n = x_right_north - x_left_north
-                sub_rectangle_volume = width_n * h_n
-                shorter_h_n_shapes = [shape_2 for shape_2 in shape_types if shape_2.height <= h_n]
-
-                solver = pywraplp.Solver.CreateSolver('SAT')
-                var_stage_2 = []
-                for s in shorter_h_n_shapes:
-                    var_stage_2.append([solver.IntVar(0, solver.infinity(), 'x' + str(s.type_id)),
-                                        s.width, s.height, s.type_id])
-
-                solver.Add(sum([v[0] * (v[1] + log.saw_kerf)
-                                for v in var_stage_2]) <= width_n)
-                solver.Maximize(sum([v[0] * v[1] * v[2] for v in var_stage_2]))
-
-                status = solver.Solve()
-
-                if status == pywraplp.Solver.OPTIMAL:
-                    # print("\n Stage 2 Solution:")
-                    # print("Obj Value = ", solver.Objective().Value())
-                    # for v in var_stage_2:
-                    #     print(v[3], " has value ", v[0].solution_value())
-                    usage_stage_2 = solver.Objective().Value()
-                    # print(f"For height {shape.height}, found usage of {usage}.")
-                    stage_2_solutions.append([usage_stage_2,
-                                              sub_rectangle_volume,
-                                              [[v[3], v[0].solution_value()] for v in var_stage_2],
-                                              h_n])
-                else:
-                    raise ValueError("Stage 2 Solution Not Converged")
-
-            if len(stage_2_solutions) > 0:
-                best_stage_2_solution = max(stage_2_solutions, key=lambda solution: solution[0])
-
-                usage_stage_2 = best_stage_2_solution[0]
-                rect_vol_stage_2 = best_stage_2_solution[1]
-                stage_2_values = best_stage_2_solution[2]
-                h_n = best_stage_2_solution[3]
-                rel_usage = (usage_stage_1 + 2 * usage_stage_2) / (rectangle_volume + 2 * rect_vol_stage_2)
-            else:
-                stage_2_values = []
-                rel_usage = usage_stage_1 / rectangle_volume
-                h_n = 0
-
-            solutions.append([rel_usage,
-                              stage_1_values,
-                              stage_2_values,
-                              [shape.height, x_left, x_right, h_n]])
-
-        if len(solutions) > 0:
-            best_complete_solution = max(solutions, key=lambda solution: solution[0])
-            logger.debug(f"Optimal solution has a total usage rate of {best_complete_solution[0]}")
-
-            shapes_in_central = best_complete_solution[1]
-            shapes_in_top_bot = best_complete_solution[2]
-        else:
-            logger.warning(f"No solution found for log {log.log_id}")
+    """
+    Reuse layouts of previously seen logs, only the remaining logs are planned
+    """
+    cache = layout_cache.create_layout_cache()
+    fingerprint = layout_cache.fingerprint_shape_types(shape_types)
+    placements = [None] * len(logs)
+    if cache is not None:
+        placements = [cache.get(log.diameter, log.saw_kerf, fingerprint) for log in logs]
+    missing = [log for log, log_placements in zip(logs, placements) if log_placements is None]
+
+    if workers > 1 and len(missing) > 1:
+        type_descriptors = [shape_type.to_descriptor() for shape_type in shape_types]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            planned = list(executor.map(plan_greedy_placement_from_descriptors,
+                                        [log.to_descriptor() for log in missing],
+                                        itertools.repeat(type_descriptors),
+                                        itertools.repeat(constants_snapshot())))
+    else:
+        planned = [[(p.shape_type.type_id, p.x, p.y) for p in plan_greedy_placement(log, shape_types)]
+                   for log in missing]
+
+    planned = iter(planned)
+    for index, log in enumerate(logs):
+        if placements[index] is None:
+            placements[index] = next(planned)
+            if cache is not None:
+                cache.put(log.diameter, log.saw_kerf, fingerprint, placements[index])
+    if cache is not None:
+        logger.info(f"Layout cache: {cache}")
+
+    """
+    Register Shapes to assigned log
+    Shapes are created in log order, such that shape ids do not depend on the number of workers
+    """
+    for log, log_placements in zip(logs, placements):
+        shapes = [Shape(shape_type=shape_types[type_id], x=x, y=y) for type_id, x, y in log_placements]
+        for shape in shapes:
+            shape.log = log
+            log.add_shape(shape)
+        all_shapes.extend(shapes)
+
+
+def constants_snapshot() -> dict:
+    """
+    :return: Current values of all plain constants, as spawned worker processes only see the defaults
+    """
+    return {name: value for name, value in vars(constants).items()
+            if not name.startswith("_") and isinstance(value, (int, float, str, bool, type(None)))}
+
+
+def plan_greedy_placement_from_descriptors(log_descriptor: tuple, type_descriptors: list,
+                                           constant_values: dict) -> list:
+    """
+    Entry point of the greedy_place worker processes
+    :return: List of (type_id, x, y) of the placed shapes
+    """
+    vars(constants).update(constant_values)
+    shape_types = [ShapeType.from_descriptor(descriptor) for descriptor in type_descriptors]
+    log = Log.from_descriptor(log_descriptor, shape_types)
+    return [(p.shape_type.type_id, p.x, p.y) for p in plan_greedy_placement(log, shape_types)]
+
+
+def plan_greedy_placement(log: Log, shape_types: list) -> list:
+    """
+    Creates the initial solution of a single log, without changing the log
+    :param log: Log
+    :param shape_types: List of Shape Types (Available sizes)
+    :return: List of Placements
+    """
+    """
+    First we go over all shapes, we make a rectangle with that size, fill it up with similar pieces,
+    and then consider the utilisation rate of that rectangle.
+    """
+    solutions = []
+    logger.debug(f"Optimising for log with diameter {log.diameter}")
+    placements = []
+
+    for shape in shape_types:
+
+        if shape.height >= log.diameter:
             continue
 
-        for var in best_complete_solution[1]:
-            logger.debug(f"Shape {var[0]} has quantity {var[1]}")
+        w_bar, x_left, x_right = ALNS_tools.calculate_max_width_rect(height=shape.height, diameter=log.diameter)
+        rectangle_volume = w_bar * shape.height
 
-        logger.debug(f"Stage two variables are given by:")
-        for var in best_complete_solution[2]:
-            logger.debug(f"Shape {var[0]} has quantity {var[1]}")
+        """
+        ---OPTIMISING CENTRAL RECTANGLE---
+        Use shapes of same height or smaller to efficiently fill rectangle.
+        This will always include the original shape itself.
+        """
+        shorter_shapes = [shape_2 for shape_2 in shape_types
+                          if shape_2.height <= shape.height]
+
+        stage_1_values, usage_stage_1 = knapsack.solve_knapsack(
+            items=ALNS_tools.create_knapsack_items(shorter_shapes, log.saw_kerf), capacity=w_bar)
 
         """
-        Creating the shapes at the corresponding locations.
-        We iterate over the shapes, and place them one by one in arbitrary order, respecting saw kerf
-        First we place the central pieces, then the top/bottom pieces
+        ---OPTIMISING NORTHERN/SOUTHERN RECTANGLE---
+        STAGE 2 OPTIMISATION
         """
+        height_a = (log.diameter - (shape.height + 2 * log.saw_kerf)) / 2
+        stage_2_solutions = []
+        shorter_a_shapes = [shape_2 for shape_2 in shape_types if shape_2.height <= height_a]
+
+        for short_shape in shorter_a_shapes:
+            h_n = short_shape.height
+            r = log.diameter / 2
+            inner_value = r ** 2 - ((log.diameter + (shape.height + 2 * log.saw_kerf)) / 2 + h_n - r) ** 2
+
+            x_left_north = r - math.sqrt(inner_value)
+            x_right_north = r + math.sqrt(inner_value)
+
+            width_n = x_right_north - x_left_north
+            sub_rectangle_volume = width_n * h_n
+            shorter_h_n_shapes = [shape_2 for shape_2 in shape_types if shape_2.height <= h_n]
+
+            stage_2_values, usage_stage_2 = knapsack.solve_knapsack(
+                items=ALNS_tools.create_knapsack_items(shorter_h_n_shapes, log.saw_kerf), capacity=width_n)
+            stage_2_solutions.append([usage_stage_2,
+                                      sub_rectangle_volume,
+                                      stage_2_values,
+                                      h_n])
+
+        if len(stage_2_solutions) > 0:
+            best_stage_2_solution = max(stage_2_solutions, key=lambda solution: solution[0])
+
+            usage_stage_2 = best_stage_2_solution[0]
+            rect_vol_stage_2 = best_stage_2_solution[1]
+            stage_2_values = best_stage_2_solution[2]
+            h_n = best_stage_2_solution[3]
+            rel_usage = (usage_stage_1 + 2 * usage_stage_2) / (rectangle_volume + 2 * rect_vol_stage_2)
+        else:
+            stage_2_values = []
+            rel_usage = usage_stage_1 / rectangle_volume
+            h_n = 0
 
-        h, x_left_central, x_right_central, h_n = best_complete_solution[3]
+        solutions.append([rel_usage,
+                          stage_1_values,
+                          stage_2_values,
+                          [shape.height, x_left, x_right, h_n]])
 
-        x = x_left_central
-        y = (log.diameter - h) / 2
+    if len(solutions) > 0:
+        best_complete_solution = max(solutions, key=lambda solution: solution[0])
+        logger.debug(f"Optimal solution has a total usage rate of {best_complete_solution[0]}")
 
-        for shape_info in shapes_in_central:
-            shape_id = shape_info[0]
-            quantity = int(shape_info[1])
-            shape_type = shape_types[shape_id]
+        shapes_in_central = best_complete_solution[1]
+        shapes_in_top_bot = best_complete_solution[2]
+    else:
+        logger.warning(f"No solution found for log {log.log_id}")
+        return placements
 
-            for i in range(quantity):
-                shapes.append(Shape(shape_type=shape_type, x=x, y=y))
-                logger.debug(f"Placing shapetype {shape_id} with w:{shape_type.width}, "
-                             f"h:{shape_type.height} at ({x}, {y})")
-                x += shape_type.width + log.saw_kerf
+    for var in best_complete_solution[1]:
+        logger.debug(f"Shape {var[0]} has quantity {var[1]}")
+
+    logger.debug(f"Stage two variables are given by:")
+    for var in best_complete_solution[2]:
+        logger.debug(f"Shape {var[0]} has quantity {var[1]}")
 
-        y_plus = (log.diameter + (h + 2 * log.saw_kerf)) / 2 + h_n
-        x_left, x_right = log.calculate_edge_positions_on_circle(z=y_plus)
+    """
+    Creating the shapes at the corresponding locations.
+    We iterate over the shapes, and place them one by one in arbitrary order, respecting saw kerf
+    First we place the central pieces, then the top/bottom pieces
+    """
 
-        x = x_left
-        y_north = y + h + log.saw_kerf
-        y_south = y - h_n - log.saw_kerf
+    h, x_left_central, x_right_central, h_n = best_complete_solution[3]
 
-        for shape_info in shapes_in_top_bot:
-            shape_id = shape_info[0]
-            quantity = int(shape_info[1])
-            shape_type = shape_types[shape_id]
+    x = x_left_central
+    y = (log.diameter - h) / 2
 
-            for i in range(quantity):
-                shapes.append(Shape(shape_type=shape_type, x=x,
-                                    y=y_north))
-                shapes.append(Shape(shape_type=shape_type, x=x,
-                                    y=y_south + (h_n - shape_type.height)))
-                logger.debug(f"Placing shapetype {shape_id} with w:{shape_type.width}, "
-                             f"h:{shape_type.height} at ({x}, {y_south + (h_n - shape_type.height)}) "
-                             f"and ({x}, {y_north})")
-                x += shape_type.width + log.saw_kerf
+    for shape_info in shapes_in_central:
+        shape_id = shape_info[0]
+        quantity = int(shape_info[1])
+        shape_type = shape_types[shape_id]
 
-        shapes = create_corner_solution(shapes, log, shape_types, h, h_n, y_north, "NW")
-        shapes = create_corner_solution(shapes, log, shape_types, h, h_n, y_north, "NE")
+        for i in range(quantity):
+            placements.append(Placement(shape_type=shape_type, x=x, y=y))
+            logger.debug(f"Placing shapetype {shape_id} with w:{shape_type.width}, "
+                         f"h:{shape_type.height} at ({x}, {y})")
+            x += shape_type.width + log.saw_kerf
 
-        shapes = create_edge_solutions(shapes, log, shape_types, h, h_n)
+    y_plus = (log.diameter + (h + 2 * log.saw_kerf)) / 2 + h_n
+    x_left, x_right = log.calculate_edge_positions_on_circle(z=y_plus)
 
-        """
-        Register Shapes to assigned log
-        """
-        for shape in shapes:
-            if shape.log is None:
-                shape.log = log
-                log.add_shape(shape)
+    x = x_left
+    y_north = y + h + log.saw_kerf
+    y_south = y - h_n - log.saw_kerf
 
-        all_shapes.extend(shapes)
-        logger.debug("Completed Initial Solution \n \n")
+    for shape_info in shapes_in_top_bot:
+        shape_id = shape_info[0]
+        quantity = int(shape_info[1])
+        shape_type = shape_types[shape_id]
+
+        for i in range(quantity):
+            placements.append(Placement(shape_type=shape_type, x=x,
+                                        y=y_north))
+            placements.append(Placement(shape_type=shape_type, x=x,
+                                        y=y_south + (h_n - shape_type.height)))
+            logger.debug(f"Placing shapetype {shape_id} with w:{shape_type.width}, "
+                         f"h:{shape_type.height} at ({x}, {y_south + (h_n - shape_type.height)}) "
+                         f"and ({x}, {y_north})")
+            x += shape_type.width + log.saw_kerf
+
+    placements = create_corner_solution(placements, log, shape_types, h, h_n, y_north, "NW")
+    placements = create_corner_solution(placements, log, shape_types, h, h_n, y_north, "NE")
+
+    placements = create_edge_solutions(placements, log, shape_types, h, h_n)
+
+    logger.debug("Completed Initial Solution \n \n")
+    return placements
 
 
 def create_corner_solution(shapes: list, log: Log, shape_types: list, h: float, h_n: float,
@@ -447,26 +793,8 @@ def create_corner_solution(shapes: list, log: Log, shape_types: list, h: float,
             shorter_shapes = [s for s in candidate_shapes
                               if s.height <= h_m]
 
-            solver = pywraplp.Solver.CreateSolver('SAT')
-
-            # add decision variables
-            var_north_west = []
-            for short_shape in shorter_shapes:
-                var_north_west.append([solver.IntVar(0, solver.infinity(), 'x' + str(short_shape.type_id)),
-                                       short_shape.width, short_shape.height, short_shape.type_id])
-
-            # add constraint for maximum length
-            solver.Add(sum([v[0] * (v[1] + log.saw_kerf)
-                            for v in var_north_west]) <= w_m)
-            solver.Maximize(sum([v[0] * v[1] * v[2] for v in var_north_west]))
-
-            status = solver.Solve()
-
-            if status == pywraplp.Solver.OPTIMAL:
-                corner_values = [[v[3], v[0].solution_value()] for v in var_north_west]
-                usage = solver.Objective().Value()
-            else:
-                raise ValueError("Solution Not Converged")
+            corner_values, usage = knapsack.solve_knapsack(
+                items=ALNS_tools.create_knapsack_items(shorter_shapes, log.saw_kerf), capacity=w_m)
 
             rel_usage = usage / (h_m * w_m)
 
@@ -496,9 +824,9 @@ def create_corner_solution(shapes: list, log: Log, shape_types: list, h: float,
 
                 if orientation == "NW":
                     x -= shape_type.width + log.saw_kerf
-                    shapes.append(Shape(shape_type=shape_type, x=x, y=y_north))
-                    shapes.append(Shape(shape_type=shape_type, x=x,
-                                        y=(log.diameter - h) / 2 - shape_type.height - log.saw_kerf))
+                    shapes.append(Placement(shape_type=shape_type, x=x, y=y_north))
+                    shapes.append(Placement(shape_type=shape_type, x=x,
+                                            y=(log.diameter - h) / 2 - shape_type.height - log.saw_kerf))
                     logger.debug(f"Placing shapetype {shape_id} with w:{shape_type.width}, "
                                  f"h:{shape_type.height} at ({x}, "
                                  f"{(log.diameter - h) / 2 - shape_type.height - log.saw_kerf}) "
@@ -508,10 +836,10 @@ def create_corner_solution(shapes: list, log: Log, shape_types: list, h: float,
 
                 elif orientation == "NE":
 
-                    shapes.append(Shape(shape_type=shape_type, x=x, y=y_north))
-                    shapes.append(Shape(shape_type=shape_type, x=x,
-                                        y=(log.diameter - h) / 2 - shape_type.height
-                                          - log.saw_kerf))
+                    shapes.append(Placement(shape_type=shape_type, x=x, y=y_north))
+                    shapes.append(Placement(shape_type=shape_type, x=x,
+                                            y=(log.diameter - h) / 2 - shape_type.height
+                                              - log.saw_kerf))
                     logger.debug(f"Placing shapetype {shape_id} with w:{shape_type.width}, "
                                  f"h:{shape_type.height} at ({x}, "
                                  f"{(log.diameter - h) / 2 - shape_type.height - log.saw_kerf}) "
@@ -525,7 +853,7 @@ def create_corner_solution(shapes: list, log: Log, shape_types: list, h: float,
 def create_edge_solutions(shapes: list, log: Log, shape_types: list, h: float, h_n: float, ) -> list:
     """
     Creates solutions for areas D in Figure 3
-    :param shapes: List of Shapes
+    :param shapes: List of Placements
     :param log: Log Object
     :param shape_types: List of all shape types
     :param h: Height of centre shapes
@@ -558,24 +886,8 @@ def create_edge_solutions(shapes: list, log: Log, shape_types: list, h: float, h
             continue
         else:
 
-            solver = pywraplp.Solver.CreateSolver('SAT')
-
-            var_top = []
-            for short_shape in shorter_shapes:
-                var_top.append([solver.IntVar(0, solver.infinity(), 'x' + str(short_shape.type_id)),
-                                short_shape.width, short_shape.height, short_shape.type_id])
-
-            # add constraint for maximum length
-            solver.Add(sum([v[0] * (v[1] + log.saw_kerf) for v in var_top]) <= w_t)
-            solver.Maximize(sum([v[0] * v[1] * v[2] for v in var_top]))
-
-            status = solver.Solve()
-
-            if status == pywraplp.Solver.OPTIMAL:
-                top_values = [[v[3], v[0].solution_value()] for v in var_top]
-                usage = solver.Objective().Value()
-            else:
-                raise ValueError("Solution Not Converged")
+            top_values, usage = knapsack.solve_knapsack(
+                items=ALNS_tools.create_knapsack_items(shorter_shapes, log.saw_kerf), capacity=w_t)
 
             rel_usage = usage / (h_t * w_t)
 
@@ -597,9 +909,9 @@ def create_edge_solutions(shapes: list, log: Log, shape_types: list, h: float, h
             shape_type = shape_types[shape_id]
 
             for i in range(quantity):
-                shapes.append(Shape(shape_type=shape_type, x=x, y=min_y))
-                shapes.append(Shape(shape_type=shape_type, x=x,
-                                    y=(log.diameter - h) / 2 - h_n - shape_type.height - 2 * log.saw_kerf))
+                shapes.append(Placement(shape_type=shape_type, x=x, y=min_y))
+                shapes.append(Placement(shape_type=shape_type, x=x,
+                                        y=(log.diameter - h) / 2 - h_n - shape_type.height - 2 * log.saw_kerf))
                 logger.debug(f"Placing shapetype {shape_id} with w:{shape_type.width}, "
                              f"h:{shape_type.height} at ({x}, "
                              f"{(log.diameter - h) / 2 - h_n - shape_type.height - log.saw_kerf})"
@@ -1,5 +1,3 @@
-import random
-
 import constants
 import numpy as np
 import logging
@@ -19,7 +17,7 @@ logger = logging.getLogger("ALNS_Methods")
 logger.setLevel(logging.DEBUG)
 
 
-def tuck(name: str, log: Log, **kwargs) -> tuple:
+def tuck(name: str, log: Log, rng: np.random.Generator, **kwargs) -> tuple:
     """
     Selects a random number of shapes in the log.
     Tries to move all shapes as much as possible in a certain direction.
@@ -32,8 +30,8 @@ def tuck(name: str, log: Log, **kwargs) -> tuple:
 
     successful = False
 
-    number_of_shapes = random.randint(0, len(log.shapes))
-    random_shapes = [select_random_shapes_from_log(log, count=number_of_shapes)]
+    number_of_shapes = int(rng.integers(0, len(log.shapes), endpoint=True))
+    random_shapes = log.select_random_shapes(count=number_of_shapes, rng=rng)
 
     if name.endswith("CENTRE"):
         # First see which direction to move the block in, move centre of block to centre of log
@@ -63,8 +61,7 @@ def tuck(name: str, log: Log, **kwargs) -> tuple:
                 if space_x != 0 or space_y != 0:
                     # logger.debug(f"Moved shape {shape.shape_id} from ({shape.x:.2f},{shape.y:.2f}) "
                     #              f"to ({shape.x + space_x:.2f}, {shape.y + space_y:.2f}) using CENTRE")
-                    shape.x += space_x
-                    shape.y += space_y
+                    log.move_shape(shape, x=shape.x + space_x, y=shape.y + space_y)
                     successful = True
             elif abs(space_x) > abs(space_y):
                 successful = True
@@ -72,14 +69,14 @@ def tuck(name: str, log: Log, **kwargs) -> tuple:
                 #     f"Moved shape {shape.shape_id} from ({shape.x:.2f}, {shape.y:.2f})
                 #     to ({shape.x + space_x:.2f}, {shape.y:.2f}) "
                 #     f"- did not move y coordinates")
-                shape.x += space_x
+                log.move_shape(shape, x=shape.x + space_x)
             else:
                 if space_x != 0 or space_y != 0:
                     # logger.debug(
                     #     f"Moved shape {shape.shape_id} from ({shape.x:.2f}, {shape.y:.2f})
                     #     to ({shape.x:.2f}, {shape.y + space_y:.2f}) "
                     #     f"- did not move x coordinates")
-                    shape.y += space_y
+                    log.move_shape(shape, y=shape.y + space_y)
                     successful = True
             if shape.x < 0 or shape.y < 0 or shape.x > log.diameter or shape.y > log.diameter:
                 raise ValueError(f"Moved {shape.shape_id} to illegal location {shape.x, shape.y} "
@@ -92,7 +89,7 @@ def tuck(name: str, log: Log, **kwargs) -> tuple:
                 successful = True
                 # logger.debug(f"Moved shape {shape.shape_id} x: {shape.x:.2f}
                 # to {shape.x - space_left:.2f} using LEFT")
-                shape.x = shape.x - space_left
+                log.move_shape(shape, x=shape.x - space_left)
     elif name.endswith("RIGHT"):
         for shape in random_shapes:
             space_right = log.find_shapes_closest_to_shape(c_shape=shape, orientation="right")
@@ -100,14 +97,14 @@ def tuck(name: str, log: Log, **kwargs) -> tuple:
                 successful = True
                 # logger.debug(f"Moved shape {shape.shape_id} x: {shape.x:.2f}
                 # to {shape.x + space_right:.2f} using RIGHT")
-                shape.x = shape.x + space_right
+                log.move_shape(shape, x=shape.x + space_right)
     elif name.endswith("UP"):
         for shape in random_shapes:
             space_up = log.find_shapes_closest_to_shape(c_shape=shape, orientation="up")
             if space_up > 0:
                 successful = True
                 # logger.debug(f"Moved shape {shape.shape_id} x: {shape.y:.2f} to {shape.y + space_up:.2f} using UP")
-                shape.y = shape.y + space_up
+                log.move_shape(shape, y=shape.y + space_up)
     elif name.endswith("DOWN"):
         for shape in random_shapes:
             space_down = log.find_shapes_closest_to_shape(c_shape=shape, orientation="down")
@@ -115,12 +112,12 @@ def tuck(name: str, log: Log, **kwargs) -> tuple:
                 successful = True
                 # logger.debug(f"Moved shape {shape.shape_id} x: {shape.y:.2f}
                 # to {shape.y + space_down:.2f} using DOWN")
-                shape.y = shape.y - space_down
+                log.move_shape(shape, y=shape.y - space_down)
     t_1 = time.perf_counter()
     return successful, t_1 - t_0
 
 
-def random_destroy(log: Log, **kwargs) -> tuple:
+def random_destroy(log: Log, rng: np.random.Generator, **kwargs) -> tuple:
     """
     Randomly removes a shape from the log. Selects a shape based on distance to the centre.
     The further the centre of a shape is from the centre of the log, the higher the likelihood of it being picked.
@@ -130,7 +127,7 @@ def random_destroy(log: Log, **kwargs) -> tuple:
     t_0 = time.perf_counter()
     successful = False
 
-    removed_shape = select_random_shapes_from_log(log)
+    removed_shape = select_random_shapes_from_log(log, rng)
 
     logger.debug(f"Removed Shape at ({removed_shape.x}, {removed_shape.y}), "
                  f"({removed_shape.x + removed_shape.width}, {removed_shape.y + removed_shape.height})")
@@ -142,18 +139,18 @@ def random_destroy(log: Log, **kwargs) -> tuple:
     return successful, t_1 - t_0
 
 
-def random_cluster_destroy(log: Log, **kwargs) -> tuple:
+def random_cluster_destroy(log: Log, rng: np.random.Generator, **kwargs) -> tuple:
     t_0 = time.perf_counter()
     successful = False
 
-    removed_shape = select_random_shapes_from_log(log)
+    removed_shape = select_random_shapes_from_log(log, rng)
 
     space_left = log.find_shapes_closest_to_shape(c_shape=removed_shape, orientation="left")
     space_right = log.find_shapes_closest_to_shape(c_shape=removed_shape, orientation="right")
     space_up = log.find_shapes_closest_to_shape(c_shape=removed_shape, orientation="up")
     space_down = log.find_shapes_closest_to_shape(c_shape=removed_shape, orientation="down")
 
-    plane = random.choices(["horizontal", "vertical"], [0.5, 0.5], k=1)[0]
+    plane = ALNS_tools.select_weighted(["horizontal", "vertical"], [0.5, 0.5], rng)
 
     min_width_check = constants.min_width_shape_type.width
     min_height_check = constants.min_height_shape_type.height
@@ -168,30 +165,25 @@ def random_cluster_destroy(log: Log, **kwargs) -> tuple:
     removed_shapes = [removed_shape]
     if plane == "horizontal":
         # remove shapes directly left and right of the shape
-        shapes_left = [s for s in log.shapes if s.x + s.width + log.saw_kerf <= removed_shape.x]
-        shapes_right = [s for s in log.shapes if s.x >= removed_shape.x + removed_shape.width + log.saw_kerf]
-
         for y_val in y_steps:
+            # Select x to be an x value just past the point where another shape's edge has been located
             x_val = removed_shape.x - space_left - 2 * log.saw_kerf
-            for shape in shapes_left:
-                # Select x to be an x value just past the point where another shape's edge has been located
-                if shape not in removed_shapes and shape.check_if_point_in_shape(x=x_val, y=y_val):
+            for shape in log.find_shapes_containing_point(x=x_val, y=y_val):
+                if shape not in removed_shapes and shape.x + shape.width + log.saw_kerf <= removed_shape.x:
                     removed_shapes.append(shape)
             x_val = removed_shape.x + removed_shape.width + space_right + 2 * log.saw_kerf
-            for shape in shapes_right:
-                if shape not in removed_shapes and shape.check_if_point_in_shape(x=x_val, y=y_val):
+            for shape in log.find_shapes_containing_point(x=x_val, y=y_val):
+                if shape not in removed_shapes and shape.x >= removed_shape.x + removed_shape.width + log.saw_kerf:
                     removed_shapes.append(shape)
     else:
-        shapes_up = [s for s in log.shapes if s.y >= removed_shape.y + removed_shape.height + log.saw_kerf]
-        shapes_down = [s for s in log.shapes if s.y + s.height + log.saw_kerf <= removed_shape.y]
         for x_val in x_steps:
-            y_val = removed_shape.y - space_down - 2 * log.saw_kerf
-            for shape in shapes_up:
-                if shape not in removed_shapes and shape.check_if_point_in_shape(x=x_val, y=y_val):
-                    removed_shapes.append(shape)
             y_val = removed_shape.y + removed_shape.height + space_up + 2 * log.saw_kerf
-            for shape in shapes_down:
-                if shape not in removed_shapes and shape.check_if_point_in_shape(x=x_val, y=y_val):
+            for shape in log.find_shapes_containing_point(x=x_val, y=y_val):
+                if shape not in removed_shapes and shape.y >= removed_shape.y + removed_shape.height + log.saw_kerf:
+                    removed_shapes.append(shape)
+            y_val = removed_shape.y - space_down - 2 * log.saw_kerf
+            for shape in log.find_shapes_containing_point(x=x_val, y=y_val):
+                if shape not in removed_shapes and shape.y + shape.height + log.saw_kerf <= removed_shape.y:
                     removed_shapes.append(shape)
 
     if len(removed_shapes) > 0:
@@ -206,7 +198,7 @@ def random_cluster_destroy(log: Log, **kwargs) -> tuple:
     return successful, t_1 - t_0
 
 
-def subspace_destroy(log: Log, **kwargs) -> tuple:
+def subspace_destroy(log: Log, rng: np.random.Generator, **kwargs) -> tuple:
     """
     Create a random set of rectangles. Calculate the efficiency in the rectangles. Remove shapes overlapping
     with the lowest efficiency rectangle.
@@ -225,7 +217,7 @@ def subspace_destroy(log: Log, **kwargs) -> tuple:
             min_value = max(constants.min_height_shape_type.height, constants.min_width_shape_type.width)
             max_value = log.diameter - min_value
             # Select a point that can fit at least a shape to prevent wasting time on small sub-rectangles
-            p_x, p_y = np.random.uniform(low=min_value, high=max_value, size=2)
+            p_x, p_y = min_value + (max_value - min_value) * rng.random(size=2)
             if log.check_if_point_in_log(p_x, p_y):
                 found_point = True
 
@@ -241,8 +233,10 @@ def subspace_destroy(log: Log, **kwargs) -> tuple:
         max_width = x_max - p_x
         max_height = y_max - p_y
 
-        width = np.random.uniform(low=constants.min_width_shape_type.width, high=max_width)
-        height = np.random.uniform(low=constants.min_height_shape_type.height, high=max_height)
+        # Unlike Generator.uniform, this allows a maximum below the minimum, for points close to the edge
+        width = constants.min_width_shape_type.width + (max_width - constants.min_width_shape_type.width) * rng.random()
+        height = (constants.min_height_shape_type.height
+                  + (max_height - constants.min_height_shape_type.height) * rng.random())
         # Place the rectangle in a way such that it fits within the boundaries
         x_0, x_1, y_0, y_1 = ALNS_tools.fit_points_in_boundaries(left_x=p_x,
                                                                  right_x=p_x + width,
@@ -286,7 +280,7 @@ def subspace_destroy(log: Log, **kwargs) -> tuple:
     return successful, t_1 - t_0
 
 
-def random_point_expansion(log: Log, shape_types: list, **kwargs) -> tuple:
+def random_point_expansion(log: Log, shape_types: list, rng: np.random.Generator, **kwargs) -> tuple:
     """
     RPE selects a random point in the log, it then calculates the maximum rectangle it can create until there
     is a collision in every direction. It then checks if this area is empty of shapes. If so, it applies an LP to
@@ -297,25 +291,14 @@ def random_point_expansion(log: Log, shape_types: list, **kwargs) -> tuple:
     """
     t_0 = time.perf_counter()
 
-    found_point = False
-    attempts = 0
-    while not found_point:
-        p_x, p_y = np.random.uniform(low=0, high=log.diameter, size=2)
-
-        if log.check_if_point_in_log(p_x, p_y):
-            point_in_shape = False
-            for shape in log.shapes:
-                if shape.check_if_point_in_shape(p_x, p_y):
-                    point_in_shape = True
-
-            if not point_in_shape:
-                found_point = True
-
-        attempts += 1
-        if attempts > 100:
-            logging.debug(f"RPE repair failed to find a suitable point")
-            t_1 = time.perf_counter()
-            return False, t_1 - t_0
+    # Points are drawn from the free space directly, areas too small to hold any shape are left out
+    rectangles, _ = log.find_free_rectangles()
+    point = log.sample_free_point(rng) if len(rectangles) > 0 else None
+    if point is None:
+        logging.debug(f"RPE repair failed to find a suitable point")
+        t_1 = time.perf_counter()
+        return False, t_1 - t_0
+    p_x, p_y = point
 
     #  logger.debug(f"Selected point in Log {log.log_id} at ({p_x: .2f}, {p_y: .2f})")
     """
@@ -326,29 +309,7 @@ def random_point_expansion(log: Log, shape_types: list, **kwargs) -> tuple:
     If the tile is occupied, we find the shape the point is contained in, and go to the edge of that shape
     """
 
-    left_most_x, right_most_x = log.calculate_edge_positions_on_circle(p_y)
-    lowest_y, highest_y = log.calculate_edge_positions_on_circle(p_x)
-
-    # logger.debug(f"Initialized x_l {left_most_x: .2f}, x_r {right_most_x: .2f}, "
-    #              f"y_min {lowest_y: .2f}, y_max {highest_y: .2f}.")
-
-    for shape in log.shapes:
-        # see if shape is in same p_x dimension
-        if shape.x - log.saw_kerf <= p_x <= shape.x + shape.width + log.saw_kerf:
-            # Then a y-collision is possible
-            if p_y > shape.y + shape.height + log.saw_kerf > lowest_y:
-                lowest_y = shape.y + shape.height + log.saw_kerf
-
-            if p_y < shape.y - log.saw_kerf < highest_y:
-                highest_y = shape.y - log.saw_kerf
-
-        if shape.y - log.saw_kerf <= p_y <= shape.y + shape.height + log.saw_kerf:
-            # Then an x-collision is possible
-            if p_x > shape.x + shape.width + log.saw_kerf > left_most_x:
-                left_most_x = shape.x + shape.width + log.saw_kerf
-
-            if p_x < shape.x - log.saw_kerf < right_most_x:
-                right_most_x = shape.x - log.saw_kerf
+    left_most_x, right_most_x, lowest_y, highest_y = log.find_free_box_around_point(p_x, p_y)
     # logger.debug(f"After checking shape collisions x_l {left_most_x: .2f}, x_r {right_most_x: .2f}, "
     #              f"y_min {lowest_y: .2f}, y_max {highest_y: .2f}.")
     successful = ALNS_tools.fit_defined_rectangle(left_most_x, right_most_x, lowest_y, highest_y, log, shape_types)
@@ -357,11 +318,11 @@ def random_point_expansion(log: Log, shape_types: list, **kwargs) -> tuple:
     return successful, t_1 - t_0
 
 
-def single_extension_repair(log: Log, shape_types: list, **kwargs) -> tuple:
+def single_extension_repair(log: Log, shape_types: list, rng: np.random.Generator, **kwargs) -> tuple:
     t_0 = time.perf_counter()
     successful = False
 
-    shape = select_random_shapes_from_log(log)
+    shape = select_random_shapes_from_log(log, rng)
 
     # Select Candidate shape ensuring the new shape is larger in at least one direction
     candidate_shapes = [s for s in shape_types if (s.height > shape.height and s.width >= shape.width) or
@@ -404,74 +365,25 @@ def single_extension_repair(log: Log, shape_types: list, **kwargs) -> tuple:
     return successful, t_1 - t_0
 
 
-def buddy_extension_repair(log: Log, shape_types: list, **kwargs) -> tuple:
+def buddy_extension_repair(log: Log, shape_types: list, rng: np.random.Generator, **kwargs) -> tuple:
     t_0 = time.perf_counter()
     successful = False
 
-    shape = select_random_shapes_from_log(log)
+    shape = select_random_shapes_from_log(log, rng)
     sk = log.saw_kerf
-    location_pairs = [[shape.x, shape.y - 2 * sk], [shape.x - 2 * sk, shape.y],  # Bot left
-                      [shape.x, shape.y + shape.height + 2 * sk], [shape.x - 2 * sk, shape.y + shape.height],
-                      # Top left
-                      [shape.x + shape.width, shape.y + shape.height + 2 * sk],
-                      [shape.x + shape.width + 2 * sk, shape.y + shape.height],  # Top Right
-                      [shape.x + shape.width + 2 * sk, shape.y], [shape.x + shape.width, shape.y - 2 * sk]]  # Bot Right
-    rect_sizes = []
-    for location in location_pairs:
-        feasible = True
-        for shape in log.shapes:
-            if shape.check_if_point_in_shape(location[0], location[1]):
-                feasible = False
-                continue
-
-        if log.check_if_point_in_log(location[0], location[1]) and feasible:
-            # TODO: (Optional) - in theory we can save computational time
-            #  by not checking the side on which the "buddy" shape is on
-            space_left = log.find_distance_to_closest_shape_from_point(x=location[0],
-                                                                       y=location[1],
-                                                                       orientation="left")
-            space_right = log.find_distance_to_closest_shape_from_point(x=location[0],
-                                                                        y=location[1],
-                                                                        orientation="right")
-            space_up = log.find_distance_to_closest_shape_from_point(x=location[0],
-                                                                     y=location[1],
-                                                                     orientation="up")
-            space_down = log.find_distance_to_closest_shape_from_point(x=location[0],
-                                                                       y=location[1],
-                                                                       orientation="down")
-            rect_sizes.append([location[0], location[1],
-                               (space_right - space_left) * (space_up - space_down),
-                               space_left, space_right, space_up, space_down])
-        else:
-            rect_sizes.append([location[0], location[1], 0, 0, 0, 0, 0])
-
-    largest_location_data = max(rect_sizes, key=lambda val: val[2])
-    x = largest_location_data[0]
-    y = largest_location_data[1]
-    space_left = largest_location_data[3]
-    space_right = largest_location_data[4]
-    space_up = largest_location_data[5]
-    space_down = largest_location_data[6]
-
-    if max(space_up, space_down) == 0 or max(space_left, space_right) == 0:
+    margin = constants.error_margin
+
+    # The buddy is placed in the largest free rectangle bordering the saw kerf zone of the shape
+    rectangles, areas = log.find_free_rectangles()
+    adjacent = ((rectangles[:, 0] <= shape.x + shape.width + sk + margin)
+                & (rectangles[:, 1] >= shape.x - sk - margin)
+                & (rectangles[:, 2] <= shape.y + shape.height + sk + margin)
+                & (rectangles[:, 3] >= shape.y - sk - margin))
+    if not adjacent.any():
         t_1 = time.perf_counter()
         return successful, t_1 - t_0
 
-    x_0 = x - space_left
-    x_1 = x + space_right
-    y_0 = y - space_down
-    y_1 = y + space_up
-    corners = [log.check_if_point_in_log(x=x_0, y=y_0),
-               log.check_if_point_in_log(x=x_0, y=y_1),
-               log.check_if_point_in_log(x=x_1, y=y_0),
-               log.check_if_point_in_log(x=x_1, y=y_1)]
-    # Ensure all corners are in the log, if not, prioritize maintaining dimension with minimal space available
-    if not all(corners):
-        if y_1 - y_0 > x_1 - x_0:
-            x_0, x_1, y_0, y_1 = ALNS_tools.fit_points_in_boundaries(x_0, x_1, y_0, y_1, priority="width", log=log)
-        else:
-            x_0, x_1, y_0, y_1 = ALNS_tools.fit_points_in_boundaries(x_0, x_1, y_0, y_1, priority="height", log=log)
-
+    x_0, x_1, y_0, y_1 = rectangles[adjacent][np.argmax(areas[adjacent])].tolist()
     successful = ALNS_tools.fit_defined_rectangle(left_most_x=x_0, right_most_x=x_1,
                                                   lowest_y=y_0, highest_y=y_1,
                                                   log=log, shape_types=shape_types)
@@ -479,6 +391,39 @@ def buddy_extension_repair(log: Log, shape_types: list, **kwargs) -> tuple:
     return successful, t_1 - t_0
 
 
+def guillotine_repair(log: Log, shape_types: list, rng: np.random.Generator, **kwargs) -> tuple:
+    """
+    Fills a large empty region in one go: a free rectangle is selected proportional to its area, and packed with
+    strips of shapes stacked on top of each other (two-stage guillotine packing).
+    :param log:
+    :param shape_types:
+    :return:
+    """
+    t_0 = time.perf_counter()
+    successful = False
+
+    rectangles, areas = log.find_free_rectangles()
+    if len(rectangles) == 0:
+        t_1 = time.perf_counter()
+        return successful, t_1 - t_0
+
+    # Free rectangles border the saw kerf zones of their neighbours, keep a margin such that shapes do not touch them
+    x_0, x_1, y_0, y_1 = rectangles[rng.choice(len(rectangles), p=areas / areas.sum())].tolist()
+    margin = constants.error_margin
+    new_shapes, usage = ALNS_tools.fit_shapes_in_rect_using_guillotine(x_min=x_0 + margin, x_max=x_1 - margin,
+                                                                       y_min=y_0 + margin, y_max=y_1 - margin,
+                                                                       shape_types=shape_types,
+                                                                       saw_kerf=log.saw_kerf)
+    for shape in new_shapes:
+        shape.assign_to_log(log)
+        successful = True
+    logger.debug(f"GUILLOTINE placed {len(new_shapes)} shapes in ({x_0:.2f}, {y_0:.2f}) - ({x_1:.2f}, {y_1:.2f}) "
+                 f"with usage {usage:.2f} in log {log.log_id}")
+
+    t_1 = time.perf_counter()
+    return successful, t_1 - t_0
+
+
 class Method:
     failure_adjust_rate = 0.95
     success_adjust_rate = 0.99
@@ -511,6 +456,8 @@ class Method:
             self.method_function = single_extension_repair
         elif name == "BER":
             self.method_function = buddy_extension_repair
+        elif name == "GUILLOTINE":
+            self.method_function = guillotine_repair
         else:
             raise ValueError(f"Method {self.name} not defined")
 
@@ -521,7 +468,7 @@ class Method:
         self.performance = self.performance * self.success_adjust_rate
         self.iteration_succeed += 1
 
-    def execute(self, log, shape_types: list) -> bool:
+    def execute(self, log, shape_types: list, rng: np.random.Generator) -> bool:
         self.times_called += 1
         attempts = 0
         repeat = True
@@ -532,7 +479,8 @@ class Method:
         while attempts < constants.max_attempts and repeat:
             self.tried_in_current_iteration += 1
             if len(log.shapes) > 0:
-                succeeded, duration = self.method_function(name=self.name, log=log, shape_types=shape_types)
+                succeeded, duration = self.method_function(name=self.name, log=log, shape_types=shape_types,
+                                                           rng=rng)
             else:
                 succeeded = False
                 repeat = False
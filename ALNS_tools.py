@@ -1,17 +1,18 @@
+import bisect
+import itertools
 import logging
 import math
-import pandas as pd
 import numpy as np
-import random
+import pandas as pd
 import datetime
 import os
+import time
 
 import matplotlib.pyplot as plt
 
-from ortools.linear_solver import pywraplp
-
 import constants
-from shapes import Shape
+import knapsack
+from shapes import Shape, ShapeType
 from logs import Log
 
 date = datetime.date.today()
@@ -44,6 +45,46 @@ def calculate_log_score(log: Log):
     return log.score
 
 
+def calculate_score_delta(log: Log, changes: tuple) -> float:
+    """
+    Difference in the score of calculate_log_score caused by the changes of a transaction, computed from the changed
+    shapes alone. Every term of calculate_log_score requires its counterpart here.
+    :param log:
+    :param changes: Changes that lead to the current layout, see Log.get_changes
+    :return:
+    """
+    volume_delta = sum([footprint.width * footprint.height for footprint in changes.added]) \
+        - sum([footprint.width * footprint.height for footprint in changes.removed])
+    return volume_delta * constants.usage_multiplier \
+        + log.calculate_sawdust_delta(changes) * constants.saw_dust_multiplier \
+        - volume_delta * constants.unused_multiplier
+
+
+def recalculate_log_score(log: Log) -> float:
+    """
+    Score of calculate_log_score computed from the shapes of the log, without any of the totals that are kept up to
+    date as shapes change. The sawdust takes O(n^2).
+    """
+    volume_used = sum([shape.get_volume() for shape in log.shapes])
+    return volume_used * constants.usage_multiplier \
+        + log.calculate_sawdust_created() * constants.saw_dust_multiplier \
+        + (log.volume - volume_used) * constants.unused_multiplier
+
+
+def verify_log_score(log: Log, iteration: int) -> bool:
+    """
+    Compares the score of the log with a full recompute, the score is corrected if they differ
+    :return: True if the scores agree
+    """
+    score = recalculate_log_score(log)
+    if abs(log.score - score) > constants.error_margin * max(1, abs(score)):
+        logger.critical(f"Score of log {log.log_id} at iteration {iteration} is {log.score}, a full recompute gives "
+                        f"{score}")
+        log.score = score
+        return False
+    return True
+
+
 def calculate_max_width_rect(height, diameter):
     if height >= diameter:
         return 0
@@ -113,6 +154,10 @@ def find_max_rectangle_width(log: Log, height: float, x: float, y: float, orient
 def check_if_new_solution_better(log_old: Log, log_new: Log, temperature: float) -> tuple:
     log_old_score = calculate_log_score(log_old)
     log_score = calculate_log_score(log_new)
+    return check_if_new_score_better(log_old_score, log_score, temperature)
+
+
+def check_if_new_score_better(log_old_score: float, log_score: float, temperature: float) -> tuple:
     # TODO: (Optional) Probability based acceptance using temperature
     if log_old_score + constants.error_margin > log_score:
         return False, 0, log_old_score
@@ -212,14 +257,54 @@ def calculate_smallest_shape_types(shape_types: list) -> None:
     constants.smallest_total_shapes = smallest_shape
 
 
-def select_log(logs: list) -> Log:
+def create_transposed_shape_types(shape_types: list) -> list:
+    """
+    Shapes can be cut in both orientations, every non-square shape type gets a transposed duplicate
+    :param shape_types: List of shapetypes
+    :return: List of the transposed shape types
+    """
+    return [ShapeType(width=shape.height, height=shape.width, ratio=shape.width / shape.height, demand=shape.demand,
+                      colour=shape.colour, duplicate_id=shape.type_id)
+            for shape in shape_types if shape.width != shape.height]
+
+
+def check_stopping_rules(logs: list, t_start: float, iterations_without_improvement: int) -> str or None:
+    """
+    Checks the stopping rules besides the temperature and the maximum number of iterations
+    :param logs: List of logs
+    :param t_start: Time the search started at (time.perf_counter)
+    :param iterations_without_improvement: Number of consecutive iterations without an accepted solution
+    :return: Reason to stop, or None to continue
+    """
+    if constants.time_limit > 0 and time.perf_counter() - t_start >= constants.time_limit:
+        return f"time limit of {constants.time_limit}s reached"
+    if 0 < constants.no_improvement_iterations <= iterations_without_improvement:
+        return f"no improvement in {iterations_without_improvement} iterations"
+    if constants.target_efficiency > 0 and all([log.efficiency >= constants.target_efficiency for log in logs]):
+        return f"all logs reached the target efficiency of {constants.target_efficiency}"
+    return None
+
+
+def select_log(logs: list, rng: np.random.Generator) -> Log:
     """
     Selects a random log based on the relative inefficiency
     :param logs:
+    :param rng: Random number generator of the search
     :return:
     """
-    total_weight = sum([log.selection_weight for log in logs])
-    return random.choices(logs, weights=[log.selection_weight / total_weight for log in logs])[0]
+    return select_weighted(logs, [log.selection_weight for log in logs], rng)
+
+
+def select_weighted(items: list, weights: list, rng: np.random.Generator):
+    """
+    Selects an item with probability proportional to its weight, like random.choices but drawing from rng
+    :param items:
+    :param weights: Non-negative weights, not necessarily summing to 1
+    :param rng: Random number generator of the search
+    :return: The selected item
+    """
+    cumulative_weights = list(itertools.accumulate(weights))
+    return items[bisect.bisect(cumulative_weights, rng.random() * cumulative_weights[-1], 0, len(items) - 1)]
 
 
 def find_orientation_from_points(centre: float, x: float, y: float) -> str:
@@ -246,42 +331,56 @@ def find_orientation_from_points(centre: float, x: float, y: float) -> str:
 def check_if_rectangle_empty(x_0: float, x_1: float, y_0: float, y_1: float, log: Log) -> list:
     """
     This function checks if there is any shape within a given rectangle in a particular log.
-    It does so by checking every delta x and delta y, where these delta values are defined
-    by the smallest possible width and height of a figure, ensuring that there is no figure fitting in
-    these points.
+    It returns every shape of which the saw kerf zone intersects the rectangle, using an exact interval overlap
+    test on the shape arrays of the log (equivalent to check_if_shape_in_rectangle for every shape).
 
     :param x_0: Smallest x coordinate
     :param x_1: Largest x coordinate
     :param y_0: Smallest y coordinate
     :param y_1: Largest x coordinate
     :param log: Log containing shapes
-    :return:
+    :return: List of shapes violating the rectangle, empty if the rectangle is empty
     """
+    return log.find_shapes_in_rectangle(x_0, x_1, y_0, y_1)
 
-    min_width_check = constants.min_width_shape_type.width
-    min_height_check = constants.min_height_shape_type.height
 
-    width_steps = int(np.floor((x_1 - x_0) / (min_width_check - 1)))
-    height_steps = int(np.floor((y_1 - y_0) / (min_height_check - 1)))
+def create_knapsack_items(shape_types: list, saw_kerf: float, vertical: bool = False) -> list:
+    """
+    Knapsack items for a strip of shapes, each shape taking up its width (or height for a vertical strip) plus saw kerf
+    :return: List of (type_id, weight, value) with the area of the shape as value
+    """
+    if vertical:
+        return [(s.type_id, s.height + saw_kerf, s.width * s.height) for s in shape_types]
+    return [(s.type_id, s.width + saw_kerf, s.width * s.height) for s in shape_types]
 
-    x_steps = [x_0 + i * min_width_check for i in range(width_steps + 1)] + [x_1]
-    y_steps = [y_0 + j * min_width_check for j in range(height_steps + 1)] + [y_1]
 
-    violating_shapes = []
-    for x_step in x_steps:
-        for y_step in y_steps:
-            # logger.debug(f"Checking ({x_step: .2f}, {y_step: .2f})")
-            for shape in log.shapes:
-                if shape.check_if_point_in_shape(x_step, y_step) and shape not in violating_shapes:
-                    violating_shapes.append(shape)
-    return violating_shapes
+def solve_strip_for_thresholds(candidate_shapes: list, shape_types: list, saw_kerf: float, capacity: float,
+                               vertical: bool) -> list:
+    """
+    Fills a horizontal strip with shape types up to the height of each candidate shape (or a vertical strip with
+    shape types up to the width of each candidate shape), sharing one knapsack pass over all shape types.
+    :return: List of (values, usage) for every candidate shape
+    """
+    if len(candidate_shapes) == 0:
+        return []
+    if vertical:
+        ordered = sorted(shape_types, key=lambda s: s.width)
+        thresholds = [s.width for s in ordered]
+        stages = [bisect.bisect_right(thresholds, shape.width) for shape in candidate_shapes]
+    else:
+        ordered = sorted(shape_types, key=lambda s: s.height)
+        thresholds = [s.height for s in ordered]
+        stages = [bisect.bisect_right(thresholds, shape.height) for shape in candidate_shapes]
+    return knapsack.solve_knapsack_stages(items=create_knapsack_items(ordered, saw_kerf, vertical=vertical),
+                                          capacity=capacity, stages=stages)
 
 
 def fit_shapes_in_rect_using_lp(x_min: float, x_max: float, y_min: float, y_max: float,
                                 candidate_shapes: list, shape_types: list, saw_kerf: float,
                                 shapes: list = None) -> tuple:
     """
-    This function applies an LP solver to a given space, optimising the space for the given candidate shapes.
+    This function solves a knapsack for every strip height (or width) in a given space, optimising the space for the
+    given candidate shapes.
     The given space, described by (x,y)-values, includes the saw kerf on the sides.
     It returns a new set of shapes that can be added in the described location.
 
@@ -303,32 +402,13 @@ def fit_shapes_in_rect_using_lp(x_min: float, x_max: float, y_min: float, y_max:
     width = x_max - x_min - 2 * saw_kerf
     height = y_max - y_min - 2 * saw_kerf
 
-    # Horizontal Solutions
+    # Horizontal Solutions - for every candidate height, the strip may hold all shape types of that height or lower.
+    # With the shape types ordered by height, a single pass solves the strip for all candidate heights.
+    # Shape types that are not candidates can never fit, either being too wide or higher than the candidate height.
     candidate_shapes = [s for s in candidate_shapes if s.width <= width]
-    for shape in candidate_shapes:
+    fills = solve_strip_for_thresholds(candidate_shapes, shape_types, saw_kerf, capacity=width, vertical=False)
+    for shape, (values, usage) in zip(candidate_shapes, fills):
         h_m = shape.height
-        shorter_shapes = [s for s in candidate_shapes if s.height <= h_m]
-
-        solver = pywraplp.Solver.CreateSolver('SAT')
-
-        variables = []
-
-        for short_shape in shorter_shapes:
-            variables.append([solver.IntVar(0, solver.infinity(), 'x' + str(short_shape.type_id)),
-                              short_shape.width, short_shape.height, short_shape.type_id])
-
-            # add constraint for maximum length
-            solver.Add(sum([v[0] * (v[1] + saw_kerf) for v in variables]) <= width)
-            solver.Maximize(sum([v[0] * v[1] * v[2] for v in variables]))
-
-        status = solver.Solve()
-
-        if status == pywraplp.Solver.OPTIMAL:
-            values = [[v[3], v[0].solution_value()] for v in variables]
-            usage = solver.Objective().Value()
-        else:
-            raise ValueError("Solution Not Converged")
-
         rel_usage = usage / (height * width)
 
         solutions.append([rel_usage,
@@ -338,30 +418,9 @@ def fit_shapes_in_rect_using_lp(x_min: float, x_max: float, y_min: float, y_max:
 
     # Vertical Solutions
     candidate_shapes = [s for s in candidate_shapes if s.height <= height]
-    for shape in candidate_shapes:
+    fills = solve_strip_for_thresholds(candidate_shapes, shape_types, saw_kerf, capacity=height, vertical=True)
+    for shape, (values, usage) in zip(candidate_shapes, fills):
         w_m = shape.width
-        shorter_shapes = [s for s in candidate_shapes if s.width <= w_m]
-
-        solver = pywraplp.Solver.CreateSolver('SAT')
-
-        variables = []
-
-        for short_shape in shorter_shapes:
-            variables.append([solver.IntVar(0, solver.infinity(), 'x' + str(short_shape.type_id)),
-                              short_shape.width, short_shape.height, short_shape.type_id])
-
-            # add constraint for maximum length
-            solver.Add(sum([v[0] * (v[2] + saw_kerf) for v in variables]) <= height)
-            solver.Maximize(sum([v[0] * v[1] * v[2] for v in variables]))
-
-        status = solver.Solve()
-
-        if status == pywraplp.Solver.OPTIMAL:
-            values = [[v[3], v[0].solution_value()] for v in variables]
-            usage = solver.Objective().Value()
-        else:
-            raise ValueError("Solution Not Converged")
-
         rel_usage = usage / (height * width)
 
         solutions.append([rel_usage,
@@ -409,6 +468,60 @@ def fit_shapes_in_rect_using_lp(x_min: float, x_max: float, y_min: float, y_max:
     return shapes, rel_usage
 
 
+def fit_shapes_in_rect_using_guillotine(x_min: float, x_max: float, y_min: float, y_max: float,
+                                        shape_types: list, saw_kerf: float) -> tuple:
+    """
+    Two-stage guillotine packing of an empty rectangle: horizontal strips are stacked on top of each other, and every
+    strip is filled with shapes next to each other. For every candidate strip height a knapsack fills the strip with
+    the shape types up to that height (solved in one pass for all heights), a second knapsack then selects the strips
+    that fill the height of the rectangle best.
+    Contrary to fit_shapes_in_rect_using_lp, the given space is where shapes can be placed, the saw kerf is only
+    included between shapes.
+
+    :param x_min: Left side x-value
+    :param x_max: Right side x-value
+    :param y_min: Bottom side y-value
+    :param y_max: Top side y-value
+    :param shape_types: List of all available shapes
+    :param saw_kerf: Saw kerf in mm
+    :return: List of new shapes and the relative usage of the rectangle
+    """
+    width = x_max - x_min
+    height = y_max - y_min
+    if width <= 0 or height <= 0:
+        return [], 0
+
+    # One candidate strip per distinct height of the shape types that fit the rectangle
+    strip_shapes = list({s.height: s for s in shape_types if s.width <= width and s.height <= height}.values())
+    fills = solve_strip_for_thresholds(strip_shapes, shape_types, saw_kerf, capacity=width + saw_kerf,
+                                       vertical=False)
+    strips = [(shape.height, values, usage) for shape, (values, usage) in zip(strip_shapes, fills) if usage > 0]
+    if len(strips) == 0:
+        return [], 0
+
+    strip_items = [(index, strip_height + saw_kerf, usage) for index, (strip_height, _, usage) in enumerate(strips)]
+    strip_quantities, usage = knapsack.solve_knapsack(items=strip_items, capacity=height + saw_kerf)
+
+    shapes = []
+    y = y_min
+    for index, quantity in strip_quantities:
+        strip_height, values, _ = strips[index]
+        for i in range(int(quantity)):
+            x = x_min
+            for type_id, shape_quantity in values:
+                shape_type = shape_types[type_id]
+                for j in range(int(shape_quantity)):
+                    shapes.append(Shape(shape_type=shape_type, x=x, y=y))
+                    x += shape_type.width + saw_kerf
+            if x - saw_kerf > x_max + constants.error_margin:
+                raise ValueError(f"Exceeding maximum x-value {x - saw_kerf} > {x_max}.")
+            y += strip_height + saw_kerf
+    if y - saw_kerf > y_max + constants.error_margin:
+        raise ValueError(f"Exceeding maximum y-value {y - saw_kerf} > {y_max}.")
+
+    return shapes, usage / (width * height)
+
+
 def fit_points_in_boundaries(left_x, right_x, low_y, high_y, log: Log, priority: str = None):
 
     if priority is None:
@@ -579,7 +692,7 @@ def fit_defined_rectangle(left_most_x: float, right_most_x: float,
     if usage_wide == usage_high == 0:
         # logger.debug("No feasible solution")
         pass
-    elif usage_wide > usage_high:
+    elif usage_wide >= usage_high:
         for shape in new_shapes_wide:
             shape.assign_to_log(log)
         successful = True
@@ -0,0 +1,92 @@
+import gzip
+import os
+import pickle
+
+import constants
+from logs import Log
+from shapes import Shape, ShapeType, get_next_shape_id, set_next_shape_id
+
+# Increase when the contents of a checkpoint change, older checkpoints can then no longer be resumed
+checkpoint_version = 3
+
+# Constants that configure a run, stored in a checkpoint such that a resumed search follows the same schedule
+run_constants = ["max_iterations", "starting_temperature", "temperature_sensitivity", "fill_up_iterations",
+                 "time_limit", "no_improvement_iterations", "target_efficiency", "usage_multiplier",
+                 "saw_dust_multiplier", "unused_multiplier", "random_seed", "checkpoint_interval"]
+
+
+def create_checkpoint(logs: list, shape_types: list, search_state: dict) -> dict:
+    """
+    :param logs: Logs without an open transaction
+    :param shape_types: List of Shape Types (Available sizes)
+    :param search_state: Local state of run_ALNS, i.e. iteration, temperature, degrees, methods, dataframes and the
+                         random number generator
+    :return: Complete state of the search, including the layouts
+    """
+    return {"version": checkpoint_version,
+            "logs": [(log.to_descriptor(), log.selection_weight, log.score) for log in logs],
+            "shape_types": [shape_type.to_descriptor() for shape_type in shape_types],
+            "next_shape_id": get_next_shape_id(),
+            "constants": {name: getattr(constants, name) for name in run_constants},
+            "search": search_state}
+
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+    """
+    Writes a gzip compressed pickle. The file is replaced at once, such that a crash while writing keeps the previous
+    checkpoint intact.
+    """
+    directory = os.path.dirname(path)
+    if directory != "" and not os.path.exists(directory):
+        os.makedirs(directory)
+    with gzip.open(path + ".tmp", "wb") as file:
+        pickle.dump(checkpoint, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(path: str) -> dict:
+    with gzip.open(path, "rb") as file:
+        checkpoint = pickle.load(file)
+    if checkpoint.get("version") != checkpoint_version:
+        raise ValueError(f"Checkpoint {path} has version {checkpoint.get('version')}, expected {checkpoint_version}")
+    return checkpoint
+
+
+def restore_run_constants(checkpoint: dict) -> None:
+    """
+    Sets the constants that configured the run of the checkpoint, see run_constants
+    """
+    vars(constants).update(checkpoint["constants"])
+
+
+def create_problem(checkpoint: dict) -> tuple:
+    """
+    Recreates the logs and shape types of a checkpoint, to resume without the original input
+    :return: List of Logs and list of ShapeTypes
+    """
+    shape_types = [ShapeType.from_descriptor(descriptor) for descriptor in checkpoint["shape_types"]]
+    logs = [Log.from_descriptor(descriptor, shape_types) for descriptor, _, _ in checkpoint["logs"]]
+    return logs, shape_types
+
+
+def restore_checkpoint(checkpoint: dict, logs: list, shape_types: list) -> dict:
+    """
+    Restores the layouts, log selection weights and shape ids of a checkpoint
+    :param logs: Logs of the checkpoint, matched by log id
+    :param shape_types: Shape types of the checkpoint, in the same order
+    :return: Local state of run_ALNS
+    """
+    if [descriptor[:3] for descriptor in checkpoint["shape_types"]] != \
+            [shape_type.to_descriptor()[:3] for shape_type in shape_types]:
+        raise ValueError("Checkpoint shape types do not match the given shape types")
+    logs_by_id = {log.log_id: log for log in logs}
+    if sorted(logs_by_id) != sorted([descriptor[0] for descriptor, _, _ in checkpoint["logs"]]):
+        raise ValueError("Checkpoint logs do not match the given logs")
+
+    for descriptor, selection_weight, score in checkpoint["logs"]:
+        log = logs_by_id[descriptor[0]]
+        log.set_shapes([Shape.from_descriptor(shape_descriptor, shape_types) for shape_descriptor in descriptor[3]])
+        log.selection_weight = selection_weight
+        log.score = score
+    set_next_shape_id(checkpoint["next_shape_id"])
+    return checkpoint["search"]
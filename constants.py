@@ -14,6 +14,15 @@ starting_temperature = 100
 max_iterations = 200
 fill_up_iterations = 5
 
+# Seed of the random number generator of the search, None for a different run every time (the seed is logged)
+random_seed = None
+
+# Additional stopping rules, 0 disables a rule - wall-clock time limit in seconds, number of iterations without an
+# accepted solution, and the efficiency at which a log is no longer optimised (the search stops once all logs reach it)
+time_limit = 0
+no_improvement_iterations = 0
+target_efficiency = 0
+
 min_destroy_degree = 1
 min_repair_degree = 5
 
@@ -41,3 +50,53 @@ method_sensitivity_rejection = 0.998
 usage_multiplier = 1
 saw_dust_multiplier = -0.0001
 unused_multiplier = 0
+
+# Spatial index parameters - number of grid cells along the diameter of a log
+spatial_grid_divisions = 16
+
+# Verify feasibility of accepted solutions every n iterations, 0 disables the check
+feasibility_check_interval = 1
+# Verify the delta evaluated score of candidates against a full recompute every n iterations, 0 disables the check
+score_check_interval = 0
+
+# Maximum number of memoised chord positions per log
+chord_cache_size = 4096
+
+# Knapsack parameters - backend "dp" (dynamic programming), "cpsat" (OR-tools) or "greedy",
+# grid resolution of the dp backend in mm
+knapsack_backend = "dp"
+knapsack_resolution = 0.1
+# Limits per knapsack solve, 0 for no limit - time in seconds, nodes as dp table cells or cpsat conflicts.
+# A solve reaching a limit falls back to the greedy solution
+knapsack_time_limit = 1.0
+knapsack_node_limit = 50000000
+# Maximum number of knapsack tables kept by the dp backend, 0 disables caching
+knapsack_cache_size = 256
+
+# Number of processes the logs are spread over when creating the initial solution, 1 plans all logs in this process
+greedy_place_workers = 1
+
+# Persistent cache of initial solutions relative to the working directory, "" disables the cache
+layout_cache_path = "cache/layouts.sqlite"
+# Maximum number of cached initial solutions and their maximum age in days
+layout_cache_max_entries = 1000
+layout_cache_max_age_days = 30
+# Increase when greedy_place changes, which invalidates all cached initial solutions
+layout_cache_version = 1
+
+# Number of processes the logs are spread over during the optimisation, 1 optimises all logs in this process
+alns_workers = 1
+
+# Number of independent searches (islands) over all logs, each in its own process, 1 disables the multi-start search
+alns_islands = 1
+# Number of epochs the multi-start search is split in, the best layouts migrate between islands after every epoch
+island_migration_epochs = 4
+
+# Minimal time in seconds between progress events of the optimisation, and the interval in ms the GUI polls them at
+progress_event_interval = 0.2
+gui_poll_interval = 100
+
+# Checkpoint of the complete search state every checkpoint_interval iterations (0 disables), relative to the working
+# directory
+checkpoint_interval = 0
+checkpoint_path = "checkpoints/alns_checkpoint.pkl.gz"
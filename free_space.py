@@ -0,0 +1,73 @@
+import numpy as np
+
+
+class FreeSpace:
+    """
+    Maximal empty rectangles (MaxRects) in the bounding square of a log.
+    Every placed shape occupies its rectangle extended by the saw kerf on all sides. The free rectangles together
+    cover the remaining area and none of them is contained in another one. Rectangles narrower or lower than the
+    given minimum dimensions can not hold any shape and are dropped.
+    Rectangles are stored as rows of (x_0, x_1, y_0, y_1), they are not clipped to the circle.
+    """
+
+    def __init__(self, size: float, min_width: float = 0, min_height: float = 0):
+        self.size = size
+        self.min_width = min_width
+        self.min_height = min_height
+        self.rectangles = np.array([[0, size, 0, size]], dtype=float)
+
+    def __len__(self) -> int:
+        return len(self.rectangles)
+
+    def occupy(self, x_0: float, x_1: float, y_0: float, y_1: float) -> None:
+        """
+        Splits every free rectangle overlapping the occupied rectangle into its (up to four) remaining parts
+        """
+        rects = self.rectangles
+        hit = (rects[:, 0] < x_1) & (rects[:, 1] > x_0) & (rects[:, 2] < y_1) & (rects[:, 3] > y_0)
+        if not hit.any():
+            return
+
+        split, kept = rects[hit], rects[~hit]
+        left, right, below, above = split.copy(), split.copy(), split.copy(), split.copy()
+        left[:, 1] = x_0
+        right[:, 0] = x_1
+        below[:, 3] = y_0
+        above[:, 2] = y_1
+        parts = np.concatenate([left, right, below, above])
+        widths = parts[:, 1] - parts[:, 0]
+        heights = parts[:, 3] - parts[:, 2]
+        parts = parts[(widths > 0) & (heights > 0) & (widths >= self.min_width) & (heights >= self.min_height)]
+
+        # A kept rectangle can not lie within a part, as it would have been contained in the rectangle that was split
+        contained = _contains(kept, parts).any(axis=0)
+        own = _contains(parts, parts)
+        # Of identical parts only the first one is kept
+        np.fill_diagonal(own, False)
+        duplicate = np.triu(own & own.T)
+        contained |= (own & ~own.T).any(axis=0) | duplicate.any(axis=0)
+        self.rectangles = np.concatenate([kept, parts[~contained]])
+
+    def sample_point(self, rng: np.random.Generator) -> tuple:
+        """
+        Draws a point uniformly from the union of the free rectangles. A point in a rectangle chosen proportional to
+        area is accepted with probability one over the number of rectangles covering it, as they overlap.
+        :param rng: Random number generator of the search
+        """
+        rects = self.rectangles
+        areas = (rects[:, 1] - rects[:, 0]) * (rects[:, 3] - rects[:, 2])
+        while True:
+            x_0, x_1, y_0, y_1 = rects[rng.choice(len(rects), p=areas / areas.sum())].tolist()
+            x, y = rng.uniform(low=x_0, high=x_1), rng.uniform(low=y_0, high=y_1)
+            covering = np.count_nonzero((rects[:, 0] <= x) & (x <= rects[:, 1])
+                                        & (rects[:, 2] <= y) & (y <= rects[:, 3]))
+            if rng.uniform() * covering < 1:
+                return x, y
+
+
+def _contains(outer: np.ndarray, inner: np.ndarray) -> np.ndarray:
+    """
+    :return: Boolean matrix, entry (i, j) indicating whether rectangle i of outer contains rectangle j of inner
+    """
+    return ((outer[:, None, 0] <= inner[None, :, 0]) & (outer[:, None, 1] >= inner[None, :, 1])
+            & (outer[:, None, 2] <= inner[None, :, 2]) & (outer[:, None, 3] >= inner[None, :, 3]))
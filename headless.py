@@ -0,0 +1,203 @@
+"""
+Headless entry point of the optimiser, running greedy_place and the ALNS without any windows.
+
+Usage: python headless.py input.json --output results [--shapes Input.xlsx] [--iterations 30] [--time-limit 60]
+                          [--checkpoint-interval 50] [--plots]
+       python headless.py --resume checkpoints/alns_checkpoint.pkl.gz --output results
+
+The input file holds the logs and shape sizes (in mm):
+{"logs": [{"diameter": 600, "saw_kerf": 3}], "shapes": [{"w": 150, "h": 50, "colour": "red"}]}
+A resumed search takes its logs, shapes and settings from the checkpoint and continues where the checkpoint was
+written, only the options that are given override the settings of the checkpoint.
+"""
+import argparse
+import json
+import os
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+
+if not os.path.exists("logs"):
+    os.makedirs("logs")
+
+import pandas as pd
+from matplotlib import pyplot as plt
+
+import ALNS
+import ALNS_tools
+import checkpoint
+import constants
+from logs import Log
+from shapes import ShapeType
+
+
+def read_shape_table(path: str) -> list:
+    """
+    Reads shape sizes from a table in the format of Input.xlsx, with columns w, h and optionally colour
+    """
+    if path.endswith(".csv"):
+        df_shapes = pd.read_csv(path)
+    else:
+        df_shapes = pd.read_excel(path)
+    return [{"w": row["w"], "h": row["h"], "colour": row["colour"] if "colour" in df_shapes.columns else None}
+            for _, row in df_shapes.iterrows()]
+
+
+def create_input(log_inputs: list, shape_inputs: list) -> tuple:
+    """
+    :param log_inputs: List of dictionaries with diameter and saw_kerf
+    :param shape_inputs: List of dictionaries with w, h and optionally colour
+    :return: List of Logs and list of ShapeTypes, including the transposed shape types
+    """
+    if len(log_inputs) == 0:
+        raise ValueError("At least 1 Log Input Required")
+    if len(shape_inputs) == 0:
+        raise ValueError("At least 1 Shape Input Required")
+
+    logs = []
+    for log_input in log_inputs:
+        diameter, saw_kerf = float(log_input["diameter"]), float(log_input["saw_kerf"])
+        if diameter <= 0 or saw_kerf <= 0:
+            raise ValueError(f"Invalid diameter or saw kerf for log {len(logs)}: {log_input}")
+        logs.append(Log(diameter=diameter, saw_kerf=saw_kerf))
+
+    shape_types = []
+    for shape_input in shape_inputs:
+        width, height = float(shape_input["w"]), float(shape_input["h"])
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Illegal dimensions for shape {len(shape_types)}: {shape_input}")
+        shape_type = ShapeType()
+        colour = shape_input.get("colour")
+        shape_type.set_properties(width=width, height=height, colour=colour if isinstance(colour, str) else None)
+        shape_types.append(shape_type)
+    shape_types.extend(ALNS_tools.create_transposed_shape_types(shape_types))
+    return logs, shape_types
+
+
+def optimise(logs: list, shape_types: list, resume: dict = None) -> tuple:
+    """
+    Creates the initial solution and optimises it, without any GUI objects
+    :param resume: Checkpoint to continue from instead of creating an initial solution
+    :return: Dataframes of the solution quality, method statistics and parameters per iteration
+    """
+    if resume is None:
+        ALNS.greedy_place(all_shapes=[], shape_types=shape_types, logs=logs)
+    return ALNS.run_ALNS(logs=logs, shape_types=shape_types, resume=resume)
+
+
+def write_results(output: str, logs: list, solution_quality_df: pd.DataFrame, method_df: pd.DataFrame,
+                  parameter_df: pd.DataFrame, duration: float, plots: bool = False) -> None:
+    """
+    Writes the layouts, a summary per log and the statistics of the run to the output directory
+    """
+    if not os.path.exists(output):
+        os.makedirs(output)
+
+    layouts = pd.DataFrame([{"log": log.log_id, "diameter": log.diameter, "saw_kerf": log.saw_kerf,
+                             "shape": shape.shape_id, "type": shape.type.type_id, "x": shape.x, "y": shape.y,
+                             "width": shape.width, "height": shape.height}
+                            for log in logs for shape in log.shapes],
+                           columns=["log", "diameter", "saw_kerf", "shape", "type", "x", "y", "width", "height"])
+    layouts.to_csv(os.path.join(output, "layouts.csv"), index=False)
+    solution_quality_df.to_csv(os.path.join(output, "solution_quality.csv"), index=False)
+    method_df.to_csv(os.path.join(output, "methods.csv"), index=False)
+    parameter_df.to_csv(os.path.join(output, "parameters.csv"), index=False)
+
+    summary = {"duration": duration,
+               "feasible": ALNS_tools.check_if_logs_feasible(logs),
+               "logs": [{"log": log.log_id, "diameter": log.diameter, "saw_kerf": log.saw_kerf,
+                         "shapes": len(log.shapes), "efficiency": log.calculate_efficiency(),
+                         "saw_dust": log.saw_dust / log.volume} for log in logs]}
+    with open(os.path.join(output, "summary.json"), "w") as file:
+        json.dump(summary, file, indent=2)
+
+    if plots:
+        for log in logs:
+            log.show_plot(show=False)
+            log.fig.savefig(os.path.join(output, f"log_{log.log_id}.png"))
+            plt.close(log.fig)
+
+
+def main(args: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Optimise the cutting of shapes from logs without a GUI")
+    parser.add_argument("input", nargs="?", help="JSON file with logs and shapes")
+    parser.add_argument("--resume", help="Checkpoint to continue the search from, replacing the input file")
+    parser.add_argument("--checkpoint-interval", type=int,
+                        help=f"Write a checkpoint to {constants.checkpoint_path} every this many iterations, "
+                             f"0 to disable (default {constants.checkpoint_interval})")
+    parser.add_argument("--output", default="results", help="Directory to write the results to")
+    parser.add_argument("--shapes", help="Table of shape sizes (Excel or CSV with columns w, h, colour), replacing "
+                                         "the shapes of the input file")
+    parser.add_argument("--iterations", type=int,
+                        help=f"Max iterations per log (default {constants.max_iterations})")
+    parser.add_argument("--temperature", type=float,
+                        help=f"Starting temperature (default {constants.starting_temperature})")
+    parser.add_argument("--time-limit", type=float,
+                        help=f"Wall-clock time limit of the search in seconds, 0 for no limit "
+                             f"(default {constants.time_limit})")
+    parser.add_argument("--no-improvement", type=int,
+                        help=f"Stop after this many iterations without an accepted solution, 0 to disable "
+                             f"(default {constants.no_improvement_iterations})")
+    parser.add_argument("--target-efficiency", type=float,
+                        help=f"Stop optimising logs at this efficiency, 0 to disable "
+                             f"(default {constants.target_efficiency})")
+    parser.add_argument("--workers", type=int, default=constants.alns_workers,
+                        help="Number of processes to spread the logs over")
+    parser.add_argument("--islands", type=int, default=constants.alns_islands,
+                        help="Number of independent searches over all logs")
+    parser.add_argument("--seed", type=int,
+                        help="Seed of the random number generator, to repeat a run exactly")
+    parser.add_argument("--plots", action="store_true", help="Save a plot of every log")
+    arguments = parser.parse_args(args)
+
+    if (arguments.iterations is not None and arguments.iterations <= 0) \
+            or (arguments.temperature is not None and arguments.temperature <= 0):
+        parser.error("The number of iterations and the starting temperature must be positive")
+    if (arguments.input is None) == (arguments.resume is None):
+        parser.error("Either an input file or a checkpoint to resume is required")
+    if arguments.resume is not None and (arguments.workers > 1 or arguments.islands > 1):
+        parser.error("A checkpoint can only be resumed by a single process search")
+    constants.alns_workers = arguments.workers
+    constants.alns_islands = arguments.islands
+
+    resume = None
+    if arguments.resume is not None:
+        try:
+            resume = checkpoint.load_checkpoint(arguments.resume)
+        except (OSError, ValueError) as e:
+            parser.error(f"Invalid checkpoint: {e}")
+        checkpoint.restore_run_constants(resume)
+        logs, shape_types = checkpoint.create_problem(resume)
+
+    # Only the options that are given override the constants, or the settings of a resumed checkpoint
+    for name, value in [("max_iterations", arguments.iterations), ("starting_temperature", arguments.temperature),
+                        ("time_limit", arguments.time_limit), ("no_improvement_iterations", arguments.no_improvement),
+                        ("target_efficiency", arguments.target_efficiency),
+                        ("checkpoint_interval", arguments.checkpoint_interval), ("random_seed", arguments.seed)]:
+        if value is not None:
+            setattr(constants, name, value)
+
+    if resume is None:
+        with open(arguments.input) as file:
+            data = json.load(file)
+        shape_inputs = read_shape_table(arguments.shapes) if arguments.shapes is not None else data.get("shapes", [])
+        try:
+            logs, shape_types = create_input(data.get("logs", []), shape_inputs)
+        except (KeyError, ValueError) as e:
+            parser.error(f"Invalid input: {e}")
+
+    t_0 = time.perf_counter()
+    solution_quality_df, method_df, parameter_df = optimise(logs, shape_types, resume)
+    t_1 = time.perf_counter()
+
+    write_results(arguments.output, logs, solution_quality_df, method_df, parameter_df, duration=t_1 - t_0,
+                  plots=arguments.plots)
+    print(f"Completed Optimisation Procedure in{(t_1 - t_0) / 60: 0.2f} Minutes! Results written to "
+          f"{arguments.output}")
+    for log in logs:
+        print(f"Log {log.log_id}: d {log.diameter}, {len(log.shapes)} shapes, usage {log.calculate_efficiency():.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import datetime
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import constants
+
+# OR-tools is an optional backend, the dynamic programming engine does not need it
+try:
+    from ortools.linear_solver import pywraplp
+except ImportError:
+    pywraplp = None
+
+date = datetime.date.today()
+logging.basicConfig(level=logging.DEBUG, filename=os.path.join(os.getcwd(), 'logs/saw_mill_app' + str(date) + '.log'),
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt="%H:%M:%S")
+logger = logging.getLogger("Knapsack")
+logger.setLevel(logging.DEBUG)
+
+# Number of solves that hit a limit and fell back to the greedy solution
+fallbacks = 0
+
+
+class KnapsackNotSolved(Exception):
+    """
+    Raised by a backend that reached its time or node limit, or otherwise failed to find a solution
+    """
+
+
+def to_units(length: float, round_up: bool) -> int:
+    """
+    Converts a length to a number of grid steps. Weights are rounded up and capacities down, such that a solution on
+    the grid is always feasible for the exact lengths. The tolerance absorbs floating point noise, e.g. 53 / 0.1.
+    """
+    steps = length / constants.knapsack_resolution
+    if round_up:
+        return math.ceil(steps - 1e-9)
+    return math.floor(steps + 1e-9)
+
+
+class KnapsackTable:
+    """
+    Unbounded knapsack with a single capacity constraint, i.e. a strip of shapes placed next to each other:
+    maximise sum(n_i * value_i) subject to sum(n_i * weight_i) <= capacity, n_i >= 0 integer.
+    Lengths are discretised on a grid of constants.knapsack_resolution. One dynamic programming pass over the items
+    gives the optimal value for every capacity up to the given bound, solutions are reconstructed per capacity.
+    """
+
+    def __init__(self, items: list, capacity: float, time_limit: float = 0, node_limit: int = 0):
+        """
+        :param items: List of (item_id, weight, value)
+        :param capacity: Largest capacity the table is built for
+        :param time_limit: Maximum time in seconds to build the table, 0 for no limit
+        :param node_limit: Maximum number of table cells to evaluate, 0 for no limit
+        """
+        self.items = items
+        self.weights = [max(to_units(weight, round_up=True), 1) for _, weight, _ in items]
+        self.size = to_units(capacity, round_up=False)
+
+        if node_limit > 0 and self.size > 0:
+            nodes = (self.size + 1) * sum([(self.size // weight).bit_length() for weight in self.weights])
+            if nodes > node_limit:
+                raise KnapsackNotSolved(f"Knapsack table of {nodes} cells exceeds the node limit of {node_limit}")
+        deadline = time.perf_counter() + time_limit if time_limit > 0 else math.inf
+
+        best = np.zeros(max(self.size + 1, 0))
+        # For every item, the number of copies of the item in the best solution for each capacity after its stage
+        self.counts = []
+        for (_, _, value), weight in zip(items, self.weights):
+            if time.perf_counter() > deadline:
+                raise KnapsackNotSolved(f"Knapsack table exceeded the time limit of {time_limit}s")
+            count = np.zeros(len(best), dtype=np.int32)
+            # Unbounded item split into copies of 1, 2, 4, ... items, each either taken or not
+            bound = self.size // weight if self.size >= 0 else 0
+            copies = 1
+            while bound > 0:
+                copies = min(copies, bound)
+                shift = copies * weight
+                candidate = best[:-shift] + copies * value
+                improved = candidate > best[shift:]
+                best[shift:] = np.where(improved, candidate, best[shift:])
+                count[shift:] = np.where(improved, count[:-shift] + copies, count[shift:])
+                bound -= copies
+                copies *= 2
+            self.counts.append(count)
+        self.best = best
+
+    def value(self, capacity: float, stage: int = None) -> float:
+        """
+        :param stage: Only consider the first stage items, all items by default
+        """
+        if stage is not None and stage < len(self.items):
+            return sum([quantity * item[2] for (_, quantity), item in zip(self.solution(capacity, stage), self.items)])
+        units = min(to_units(capacity, round_up=False), self.size)
+        if units < 0:
+            return 0
+        return float(self.best[units])
+
+    def solution(self, capacity: float, stage: int = None) -> list:
+        """
+        As items are added one at a time, the table also holds the best solutions using only the first items
+        :param stage: Only consider the first stage items, all items by default
+        :return: List of [item_id, quantity] for the considered items
+        """
+        if stage is None:
+            stage = len(self.items)
+        units = min(to_units(capacity, round_up=False), self.size)
+        quantities = [0] * stage
+        if units >= 0:
+            for index in reversed(range(stage)):
+                quantities[index] = int(self.counts[index][units])
+                units -= quantities[index] * self.weights[index]
+        return [[item[0], quantity] for item, quantity in zip(self.items, quantities)]
+
+
+class KnapsackCache:
+    """
+    LRU cache of knapsack tables, keyed by the items, i.e. the fingerprint of the shape types with their weights
+    (including saw kerf) and values. A table answers every capacity up to its bound, hence a cached table is reused for
+    all smaller (quantised) capacities and only rebuilt for a larger one.
+    """
+
+    def __init__(self, maxsize: int = None):
+        """
+        :param maxsize: Maximum number of cached tables, 0 disables the cache. None follows
+                        constants.knapsack_cache_size, also when it changes at runtime
+        """
+        self.maxsize = maxsize
+        self.tables = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def __str__(self):
+        return f"{len(self)} tables, hits: {self.hits}, misses: {self.misses}, evictions: {self.evictions}"
+
+    def get_table(self, items: list, capacity: float) -> KnapsackTable:
+        maxsize = constants.knapsack_cache_size if self.maxsize is None else self.maxsize
+        # The limit may have been lowered since the last call
+        self.evict(maxsize)
+        key = tuple(items)
+        table = self.tables.get(key)
+        if table is not None and to_units(capacity, round_up=False) <= table.size:
+            self.hits += 1
+            self.tables.move_to_end(key)
+            return table
+
+        self.misses += 1
+        if table is not None:
+            capacity = max(capacity, table.size * constants.knapsack_resolution)
+        table = KnapsackTable(items, capacity, time_limit=constants.knapsack_time_limit,
+                              node_limit=constants.knapsack_node_limit)
+        if maxsize > 0:
+            self.tables[key] = table
+            self.tables.move_to_end(key)
+            self.evict(maxsize)
+        return table
+
+    def evict(self, maxsize: int) -> None:
+        """
+        Removes the least recently used tables until at most maxsize remain
+        """
+        while len(self.tables) > maxsize:
+            self.tables.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.tables.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+table_cache = KnapsackCache()
+
+
+def solve_knapsack(items: list, capacity: float) -> tuple:
+    """
+    Solves a single capacity knapsack with the backend set in constants.knapsack_backend
+    :param items: List of (item_id, weight, value)
+    :param capacity: Maximum total weight
+    :return: List of [item_id, quantity] for all items and the objective value
+    """
+    return solve_knapsack_stages(items, capacity, [len(items)])[0]
+
+
+def solve_knapsack_stages(items: list, capacity: float, stages: list) -> list:
+    """
+    Solves the knapsack restricted to the first n items, for every n in stages. The dp backend does so in a single pass
+    over the items. If the backend reaches its time or node limit, the greedy solution is used instead.
+    :param items: List of (item_id, weight, value)
+    :param capacity: Maximum total weight
+    :param stages: Numbers of items to consider
+    :return: List of (solution, objective value) for every stage
+    """
+    global fallbacks
+
+    try:
+        if constants.knapsack_backend == "dp":
+            table = table_cache.get_table(items, capacity)
+            return [(table.solution(capacity, stage), table.value(capacity, stage)) for stage in stages]
+        elif constants.knapsack_backend == "cpsat":
+            return [solve_knapsack_using_cpsat(items[:stage], capacity) for stage in stages]
+        elif constants.knapsack_backend == "greedy":
+            return [solve_knapsack_greedy(items[:stage], capacity) for stage in stages]
+        else:
+            raise ValueError(f"Knapsack backend {constants.knapsack_backend} not defined")
+    except KnapsackNotSolved as e:
+        fallbacks += 1
+        logger.warning(f"{e}, using the greedy solution instead")
+        return [solve_knapsack_greedy(items[:stage], capacity) for stage in stages]
+
+
+def solve_knapsack_greedy(items: list, capacity: float) -> tuple:
+    """
+    Takes as many copies as fit of every item, in order of decreasing value per unit of weight
+    """
+    quantities = {}
+    remaining = capacity
+    for item_id, weight, value in sorted(items, key=lambda item: item[2] / item[1], reverse=True):
+        quantities[item_id] = max(math.floor(remaining / weight + 1e-9), 0)
+        remaining -= quantities[item_id] * weight
+    return [[item_id, quantities[item_id]] for item_id, _, _ in items], \
+        sum([quantities[item_id] * value for item_id, _, value in items])
+
+
+def solve_knapsack_using_cpsat(items: list, capacity: float) -> tuple:
+    if pywraplp is None:
+        raise ImportError("The cpsat knapsack backend requires the ortools package")
+
+    solver = pywraplp.Solver.CreateSolver('SAT')
+    if constants.knapsack_time_limit > 0:
+        solver.SetTimeLimit(int(constants.knapsack_time_limit * 1000))
+    if constants.knapsack_node_limit > 0:
+        solver.SetSolverSpecificParametersAsString(f"max_number_of_conflicts: {constants.knapsack_node_limit}")
+    variables = [solver.IntVar(0, solver.infinity(), 'x' + str(item_id)) for item_id, _, _ in items]
+    solver.Add(sum([v * weight for v, (_, weight, _) in zip(variables, items)]) <= capacity)
+    solver.Maximize(sum([v * value for v, (_, _, value) in zip(variables, items)]))
+
+    status = solver.Solve()
+
+    if status == pywraplp.Solver.OPTIMAL:
+        return [[item[0], int(round(v.solution_value()))] for item, v in zip(items, variables)], \
+            solver.Objective().Value()
+    elif status == pywraplp.Solver.FEASIBLE:
+        # Limit reached, keep the best of the incumbent and the greedy solution
+        incumbent = [[item[0], int(round(v.solution_value()))] for item, v in zip(items, variables)], \
+            solver.Objective().Value()
+        return max(incumbent, solve_knapsack_greedy(items, capacity), key=lambda solution: solution[1])
+    else:
+        raise KnapsackNotSolved(f"Knapsack solver returned status {status}")
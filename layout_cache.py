@@ -0,0 +1,121 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import constants
+
+date = datetime.date.today()
+logging.basicConfig(level=logging.DEBUG, filename=os.path.join(os.getcwd(), 'logs/saw_mill_app' + str(date) + '.log'),
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt="%H:%M:%S")
+logger = logging.getLogger("Layout Cache")
+logger.setLevel(logging.DEBUG)
+
+
+def fingerprint_shape_types(shape_types: list) -> str:
+    """
+    Fingerprint of everything besides the log that determines the initial solution: the shape types in order (as the
+    placements refer to them by type id) and the knapsack settings
+    """
+    description = [[shape_type.type_id, shape_type.width, shape_type.height] for shape_type in shape_types]
+    description.append([constants.knapsack_backend, constants.knapsack_resolution, constants.knapsack_time_limit,
+                        constants.knapsack_node_limit])
+    return hashlib.sha1(json.dumps(description).encode()).hexdigest()
+
+
+class LayoutCache:
+    """
+    SQLite store of initial solutions, mapping (diameter, saw kerf, shape type fingerprint) to the placements
+    [type_id, x, y] created by greedy_place.
+    Layouts of another constants.layout_cache_version or older than the maximum age are invalid and deleted, beyond
+    the maximum number of layouts the least recently used ones are deleted.
+    A failing database only disables the cache, it never stops the initial solution from being created.
+    """
+
+    def __init__(self, path: str, max_entries: int, max_age_days: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return f"{self.path}, hits: {self.hits}, misses: {self.misses}"
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory != "" and not os.path.exists(directory):
+            os.makedirs(directory)
+        connection = sqlite3.connect(self.path)
+        connection.execute("CREATE TABLE IF NOT EXISTS layouts ("
+                           "diameter REAL, saw_kerf REAL, fingerprint TEXT, version INTEGER, placements TEXT, "
+                           "created REAL, last_used REAL, PRIMARY KEY (diameter, saw_kerf, fingerprint, version))")
+        return connection
+
+    def get(self, diameter: float, saw_kerf: float, fingerprint: str) -> list or None:
+        """
+        :return: List of [type_id, x, y], or None if no valid layout is stored
+        """
+        try:
+            with closing(self._connect()) as connection, connection:
+                row = connection.execute("SELECT placements FROM layouts WHERE diameter = ? AND saw_kerf = ? "
+                                         "AND fingerprint = ? AND version = ? AND created >= ?",
+                                         (diameter, saw_kerf, fingerprint, constants.layout_cache_version,
+                                          time.time() - self.max_age)).fetchone()
+                if row is not None:
+                    connection.execute("UPDATE layouts SET last_used = ? WHERE diameter = ? AND saw_kerf = ? "
+                                       "AND fingerprint = ? AND version = ?",
+                                       (time.time(), diameter, saw_kerf, fingerprint,
+                                        constants.layout_cache_version))
+        except sqlite3.Error as e:
+            logger.warning(f"Layout cache {self.path} could not be read: {e}")
+            row = None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, diameter: float, saw_kerf: float, fingerprint: str, placements: list) -> None:
+        """
+        :param placements: List of [type_id, x, y]
+        """
+        now = time.time()
+        try:
+            with closing(self._connect()) as connection, connection:
+                connection.execute("INSERT OR REPLACE INTO layouts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   (diameter, saw_kerf, fingerprint, constants.layout_cache_version,
+                                    json.dumps(placements), now, now))
+                self.prune(connection)
+        except sqlite3.Error as e:
+            logger.warning(f"Layout cache {self.path} could not be written: {e}")
+
+    def prune(self, connection: sqlite3.Connection) -> None:
+        connection.execute("DELETE FROM layouts WHERE version != ? OR created < ?",
+                           (constants.layout_cache_version, time.time() - self.max_age))
+        connection.execute("DELETE FROM layouts WHERE rowid NOT IN "
+                           "(SELECT rowid FROM layouts ORDER BY last_used DESC LIMIT ?)", (self.max_entries,))
+
+    def clear(self) -> None:
+        try:
+            with closing(self._connect()) as connection, connection:
+                connection.execute("DELETE FROM layouts")
+        except sqlite3.Error as e:
+            logger.warning(f"Layout cache {self.path} could not be cleared: {e}")
+        self.hits = self.misses = 0
+
+
+def create_layout_cache() -> LayoutCache or None:
+    """
+    :return: Layout cache as set in the constants, None if disabled
+    """
+    if constants.layout_cache_path == "" or constants.layout_cache_max_entries <= 0:
+        return None
+    return LayoutCache(path=os.path.join(os.getcwd(), constants.layout_cache_path),
+                       max_entries=constants.layout_cache_max_entries,
+                       max_age_days=constants.layout_cache_max_age_days)
@@ -1,12 +1,17 @@
 import logging
 
-import ALNS_tools
 import constants
 from shapes import Shape
+from spatial_index import SpatialGrid
+from shape_store import ShapeStore
+from free_space import FreeSpace
+from weight_tree import WeightTree
 
+import bisect
 import datetime
+from collections import namedtuple
+import heapq
 import math
-import random
 import numpy as np
 import matplotlib.pyplot as plt
 import os
@@ -19,6 +24,11 @@ logger.setLevel(logging.DEBUG)
 
 log_id = 0
 
+# Location and dimensions of a shape at one moment, e.g. before the changes of a transaction
+Footprint = namedtuple("Footprint", ["shape_id", "x", "y", "width", "height"])
+# Net changes of a transaction - footprints of the added and removed shapes, and (before, after) of the moved shapes
+LayoutChanges = namedtuple("LayoutChanges", ["added", "removed", "moved"])
+
 
 class Log:
     def __init__(self, diameter: float = 0, saw_kerf=None, copy_id: int = None) -> None:
@@ -45,8 +55,25 @@ class Log:
         # Plotting Variables
         self.fig = None
         self.ax = None
-        self.shapes = []
         self.patches = []
+        # Plot artists of every drawn shape, by shape id
+        self.artists = {}
+
+        # Array backed shape storage, self.shapes is a view on it. Spatial index for neighbour and collision queries
+        self.store = ShapeStore()
+        self.grid = SpatialGrid(cell_size=self.diameter / constants.spatial_grid_divisions)
+        # Maximal free rectangles, rebuilt lazily after shapes have been removed or moved
+        self.free_space = None
+        # Selection weights of the shapes by store slot, and the cached weight per shape dimensions
+        self.selection_tree = WeightTree()
+        self.selection_weights = {}
+
+        # Journal of ("add" / "remove" / "move", shape, x, y) records while a transaction is open,
+        # x and y being the location of the shape before the change
+        self.journal = None
+
+        # Memoised chords of the circle, see calculate_edge_positions_on_circle
+        self.chords = {}
 
         # Log buttons for inputs
         self.label = None
@@ -54,12 +81,64 @@ class Log:
         self.saw_kerf_input = None
         self.remove_button = None
 
+    @property
+    def shapes(self) -> tuple:
+        return self.store.view()
+
     def set_diameter(self):
         self.diameter = float(self.diameter_input.get())
         self.volume = math.pi * (self.diameter / 2) ** 2
+        self.chords = {}
+        self.selection_weights = {}
+        for shape in self.shapes:
+            self.selection_tree.set(self.store.slot_of[shape.shape_id], self.calculate_selection_weight(shape))
+        self.rebuild_grid()
 
     def set_saw_kerf(self):
         self.saw_kerf = float(self.saw_kerf_input.get())
+        self.rebuild_grid()
+
+    def rebuild_grid(self) -> None:
+        self.grid = SpatialGrid(cell_size=self.diameter / constants.spatial_grid_divisions)
+        self.free_space = None
+        for shape in self.shapes:
+            self.grid.insert(shape, self.saw_kerf)
+        if len(self.shapes) > 0:
+            self.saw_dust = self.calculate_sawdust_created()
+
+    def to_descriptor(self) -> tuple:
+        """
+        :return: Picklable description of the log and its shapes, without any of its widgets or plots
+        """
+        return self.log_id, self.diameter, self.saw_kerf, tuple([shape.to_descriptor() for shape in self.shapes])
+
+    @classmethod
+    def from_descriptor(cls, descriptor: tuple, shape_types: list):
+        log_id, diameter, saw_kerf, shape_descriptors = descriptor
+        log = cls(diameter=diameter, saw_kerf=saw_kerf, copy_id=log_id)
+        log.set_shapes([Shape.from_descriptor(shape_descriptor, shape_types) for shape_descriptor in shape_descriptors])
+        return log
+
+    def set_shapes(self, shapes: list) -> None:
+        """
+        Replaces the layout of the log by the given shapes. Outside a transaction the storage and indexes are built
+        anew, such that the state of the log only depends on the given shapes and their order.
+        """
+        for shape in self.shapes:
+            if self.journal is not None:
+                self.remove_shape(shape)
+            shape.log = None
+        if self.journal is None:
+            self.store = ShapeStore()
+            self.grid = SpatialGrid(cell_size=self.diameter / constants.spatial_grid_divisions)
+            self.free_space = None
+            self.selection_tree = WeightTree()
+            self.saw_dust = 0
+            self.volume_used = 0
+            self.calculate_efficiency()
+        for shape in shapes:
+            shape.log = self
+            self.add_shape(shape)
 
     def remove_labels(self):
         global log_id
@@ -82,15 +161,22 @@ class Log:
     def update_plot(self, extra_text="") -> None:
         for patch in self.patches:
             patch.remove()
+        self.patches = []
+        for artists in self.artists.values():
+            for artist in artists:
+                artist.remove()
+        self.artists = {}
         for shape in self.shapes:
-            self.patches.extend(shape.add_rect_to_plot())
+            artists = shape.add_rect_to_plot()
+            if artists is not None:
+                self.artists[shape.shape_id] = artists
         circle = plt.Circle((self.diameter / 2, self.diameter / 2), self.diameter / 2,
                             color='saddlebrown', fill=False)
         self.ax.add_patch(circle)
         self.ax.set_title(f"id: {self.log_id}, "
                           r"$d_i$:" + f"{self.diameter}, "
                                       f"Usage:" + f"{self.calculate_efficiency():.2f}, "
-                                                  f"Saw dust:" + f"{self.calculate_sawdust_created() / self.volume:.2f}" + extra_text)
+                                                  f"Saw dust:" + f"{self.saw_dust / self.volume:.2f}" + extra_text)
         self.patches.append(circle)
 
     def calculate_efficiency(self) -> float:
@@ -98,20 +184,17 @@ class Log:
         return self.efficiency
 
     def calculate_efficiency_sub_rectangle(self, x_0, x_1, y_0, y_1, saw_kerf: float) -> tuple:
-        intersecting_shapes = []
-        for shape in self.shapes:
-            if ALNS_tools.check_if_shape_in_rectangle(shape, x_0, x_1, y_0, y_1, saw_kerf=saw_kerf):
-                intersecting_shapes.append(shape)
+        slots = self.store.find_in_rectangle(x_0, x_1, y_0, y_1, saw_kerf=saw_kerf)
+        intersecting_shapes = self.store.shapes_in_slots(slots)
 
         if len(intersecting_shapes) == 0:
             return 0, intersecting_shapes
 
         volume_rect = (x_1 - x_0) * (y_1 - y_0)
-        shape_volume_in_rect = 0
-        for shape in intersecting_shapes:
-            # calculate shape volume in rect
-            shape_volume_in_rect += ((min(x_1, shape.x + shape.width) - max(x_0, shape.x)) *
-                                     (min(y_1, shape.y + shape.height) - max(y_0, shape.y)))
+        x, y, w, h = self.store.x[slots], self.store.y[slots], self.store.width[slots], self.store.height[slots]
+        # calculate shape volume in rect
+        shape_volume_in_rect = float(np.sum((np.minimum(x_1, x + w) - np.maximum(x_0, x)) *
+                                            (np.minimum(y_1, y + h) - np.maximum(y_0, y))))
         rel_usage = shape_volume_in_rect / volume_rect, intersecting_shapes
         # logging.debug(f"Efficiency of sub-rectangle (({x_0}, {y_0}), ({x_1},{y_1})) is {rel_usage}")
         return rel_usage
@@ -132,40 +215,132 @@ class Log:
                                       f"plots/log_{self.log_id}_{date_time.strftime('%d_%m_%Y_%H_%M_%S')}.png"))
 
     def calculate_edge_positions_on_circle(self, z: float) -> tuple:
+        """
+        :param z: Position along one axis of the log
+        :return: Lowest and highest position on the circle along the other axis at z. Positions outside of the log
+        are clamped onto its edge, where the chord is empty. Results are memoised per log.
+        """
+        chord = self.chords.get(z)
+        if chord is None:
+            r = self.diameter / 2
+            half_chord = math.sqrt(max(r ** 2 - (z - r) ** 2, 0))
+            chord = (r - half_chord, r + half_chord)
+            if len(self.chords) >= constants.chord_cache_size:
+                self.chords.clear()
+            self.chords[z] = chord
+        return chord
+
+    def calculate_edge_positions_on_circle_array(self, z: np.ndarray) -> tuple:
+        """
+        Vectorised variant of calculate_edge_positions_on_circle
+        :return: Arrays of lowest and highest positions on the circle
+        """
         r = self.diameter / 2
-        try:
-            z_min = r - math.sqrt(r ** 2 - (z - r) ** 2)
-            z_plus = r + math.sqrt(r ** 2 - (z - r) ** 2)
-        except ValueError as e:
-            self.show_plot()
-            logger.critical(f"Math domain error for {z} in log {self.log_id}: {e}")
-            raise ValueError(f"Math domain error for {z} in log {self.log_id}")
-        return z_min, z_plus
+        half_chord = np.sqrt(np.maximum(r ** 2 - (np.asarray(z) - r) ** 2, 0))
+        return r - half_chord, r + half_chord
 
     def check_if_feasible(self) -> bool:
-        for index_1, s1 in enumerate(self.shapes):
-            if not s1.shape_is_within_log():
-                logger.critical(f"Shape {s1.shape_id} falls outside of log {self.log_id}")
-                return False
+        """
+        Verifies that all shapes fall within the log and that no two shapes intersect (including saw kerf).
+        Containment is checked for all shapes at once, intersections are found with a sweep over the x-sorted
+        shapes, keeping the y-intervals of the shapes overlapping the sweep position in a sorted active set.
+        """
+        x, y, w, h, active = self.store.columns()
+        slots = np.flatnonzero(active)
+
+        outside = slots[~self.check_if_slots_within_log(slots)]
+        if len(outside) > 0:
+            logger.critical(f"Shape {self.store.shape_id[outside[0]]} falls outside of log {self.log_id}")
+            return False
 
-            for s2 in self.shapes[index_1 + 1:]:
-                if check_shapes_intersect(s1, s2, self.saw_kerf):
+        # Two shapes intersect when both their x- and y-intervals, extended by the saw kerf, overlap
+        extension = self.saw_kerf - constants.error_margin
+        active_intervals = []
+        ending = []
+        for slot in slots[np.argsort(x[slots], kind="stable")]:
+            while len(ending) > 0 and ending[0][0] < x[slot]:
+                _, interval = heapq.heappop(ending)
+                active_intervals.pop(bisect.bisect_left(active_intervals, interval))
+
+            interval = (y[slot], y[slot] + h[slot] + extension, slot)
+            index = bisect.bisect_left(active_intervals, interval)
+            # Active intervals are disjoint, hence only the direct neighbours can overlap the new interval
+            for neighbour in active_intervals[max(index - 1, 0):index + 1]:
+                if neighbour[0] <= interval[1] and interval[0] <= neighbour[1]:
+                    s1, s2 = self.store.slot_shapes[neighbour[2]], self.store.slot_shapes[slot]
                     logger.critical(f"Shapes {s1.shape_id} and {s2.shape_id} intersect in log {self.log_id}!")
                     logger.critical(f"Coordinates are: (({s1.x},{s1.y}), "
                                     f"({s1.x + s1.width} {s1.y + s1.height})),"
                                     f"(({s2.x}, {s2.y}), ({s2.x + s2.width, s2.y + s2.height}))")
                     return False
-                else:
-                    pass
+            active_intervals.insert(index, interval)
+            heapq.heappush(ending, (x[slot] + w[slot] + extension, interval))
         return True
 
+    def check_if_slots_within_log(self, slots: np.ndarray) -> np.ndarray:
+        """
+        Vectorised equivalent of Shape.shape_is_within_log for the shapes in the given store slots
+        """
+        x, y = self.store.x[slots], self.store.y[slots]
+        x_1, y_1 = x + self.store.width[slots], y + self.store.height[slots]
+        y_min_left, y_plus_left = self.calculate_edge_positions_on_circle_array(x)
+        y_min_right, y_plus_right = self.calculate_edge_positions_on_circle_array(x_1)
+        x_min_bot, x_plus_bot = self.calculate_edge_positions_on_circle_array(y)
+        x_min_top, x_plus_top = self.calculate_edge_positions_on_circle_array(y_1)
+        margin = constants.error_margin
+        return ((x + margin >= x_min_bot) & (x + margin >= x_min_top)
+                & (x_1 <= x_plus_top + margin) & (x_1 <= x_plus_bot + margin)
+                & (y + margin >= y_min_left) & (y + margin >= y_min_right)
+                & (y_1 <= y_plus_left + margin) & (y_1 <= y_plus_right + margin))
+
     def add_shape(self, shape: Shape) -> None:
         #  logger.debug(f"Adding shape {shape.shape_id} to log {self.log_id}.")
-        self.shapes.append(shape)
+        if self.journal is not None:
+            self.journal.append(("add", shape, shape.x, shape.y))
+        slot = self.store.insert(shape)
+        self.selection_tree.set(slot, self.calculate_selection_weight(shape))
+        self.grid.insert(shape, self.saw_kerf)
+        if self.free_space is not None:
+            self.occupy_free_space(shape)
+        self.saw_dust += self.calculate_sawdust_of_shape(shape) - self.calculate_sawdust_shared_with_neighbours(shape)
         self.volume_used += shape.get_volume()
         self.calculate_efficiency()
 
+    def calculate_selection_weight(self, shape: Shape) -> float:
+        """
+        Shapes of which the dimensions are further from the diameter are more likely to be selected
+        """
+        weight = self.selection_weights.get((shape.width, shape.height))
+        if weight is None:
+            weight = math.sqrt((shape.width - self.diameter) ** 2 + (shape.height - self.diameter) ** 2)
+            self.selection_weights[(shape.width, shape.height)] = weight
+        return weight
+
+    def select_random_shapes(self, count: int, rng: np.random.Generator) -> list:
+        """
+        Samples distinct shapes proportional to their selection weight, in O(log n) per shape
+        :param rng: Random number generator of the search
+        :return: List of up to count shapes
+        """
+        return self.store.shapes_in_slots(self.selection_tree.sample_without_replacement(count, rng))
+
+    def calculate_sawdust_of_shape(self, shape: Shape) -> float:
+        return 2 * shape.width * self.saw_kerf + 2 * shape.height * self.saw_kerf + 4 * (self.saw_kerf ** 2)
+
+    def calculate_sawdust_shared_with_neighbours(self, shape: Shape) -> float:
+        """
+        Sawdust the shape shares with the shapes whose saw kerf zone touches its own saw kerf zone
+        """
+        neighbours = self.grid.query(x_0=shape.x - self.saw_kerf, x_1=shape.x + shape.width + self.saw_kerf,
+                                     y_0=shape.y - self.saw_kerf, y_1=shape.y + shape.height + self.saw_kerf)
+        return sum([calculate_sawdust_shared_between_shapes(shape, neighbour, self.saw_kerf)
+                    for neighbour in neighbours if neighbour.shape_id != shape.shape_id])
+
     def calculate_sawdust_created(self) -> float:
+        """
+        Recalculates the sawdust of the complete layout from scratch.
+        self.saw_dust keeps the same value up to date incrementally, this is only required for verification.
+        """
         # First calculate total sawdust
         saw_dust_m_2 = 0
         for shape in self.shapes:
@@ -181,13 +356,201 @@ class Log:
 
     def remove_shape(self, shape: Shape) -> None:
         try:
-            self.shapes.remove(shape)
+            slot = self.store.remove(shape)
+            self.selection_tree.set(slot, 0.0)
+            if self.journal is not None:
+                self.journal.append(("remove", shape, shape.x, shape.y))
+            self.saw_dust -= (self.calculate_sawdust_of_shape(shape)
+                              - self.calculate_sawdust_shared_with_neighbours(shape))
+            self.grid.remove(shape)
+            self.free_space = None
             self.volume_used -= shape.get_volume()
             self.calculate_efficiency()
-        except ValueError as e:
+        except KeyError as e:
             print(f"Was not able to remove shape {shape.shape_id} from log {self.log_id}."
                   f"Error {e}")
 
+    def move_shape(self, shape: Shape, x: float = None, y: float = None) -> None:
+        """
+        Moves a shape that is placed in this log, keeping the spatial index and sawdust up to date.
+        :param shape: Shape in this log
+        :param x: Updated x Location - remains same if not entered
+        :param y: Updated y Location - remains same if not entered
+        """
+        if self.journal is not None:
+            self.journal.append(("move", shape, shape.x, shape.y))
+        self.saw_dust += self.calculate_sawdust_shared_with_neighbours(shape)
+        shape.set_location(x=x, y=y)
+        self.store.update(shape)
+        self.grid.move(shape, self.saw_kerf)
+        self.free_space = None
+        self.saw_dust -= self.calculate_sawdust_shared_with_neighbours(shape)
+
+    def occupy_free_space(self, shape: Shape) -> None:
+        self.free_space.occupy(x_0=shape.x - self.saw_kerf, x_1=shape.x + shape.width + self.saw_kerf,
+                               y_0=shape.y - self.saw_kerf, y_1=shape.y + shape.height + self.saw_kerf)
+
+    def update_free_space(self, min_width: float, min_height: float) -> None:
+        """
+        Rebuilds the free space if shapes have been removed or moved, or if the minimum dimensions have changed
+        """
+        free_space = self.free_space
+        if free_space is None or free_space.min_width != min_width or free_space.min_height != min_height:
+            self.free_space = FreeSpace(self.diameter, min_width=min_width, min_height=min_height)
+            for shape in self.shapes:
+                self.occupy_free_space(shape)
+
+    def find_free_rectangles(self) -> tuple:
+        """
+        Finds the maximal free rectangles and fits them in the circle, keeping those that can still hold the smallest
+        shape types, including the saw kerf on both sides. The free space is rebuilt if shapes have been removed or
+        moved since the last call.
+        :return: Array of fitted free rectangles as rows (x_0, x_1, y_0, y_1) and an array of their areas
+        """
+        min_width = min_height = 0
+        if constants.min_width_shape_type is not None:
+            min_width = constants.min_width_shape_type.width + 2 * self.saw_kerf
+            min_height = constants.min_height_shape_type.height + 2 * self.saw_kerf
+
+        self.update_free_space(min_width, min_height)
+        rectangles = np.column_stack(self.fit_rectangles_in_log(*self.free_space.rectangles.T))
+        width = rectangles[:, 1] - rectangles[:, 0]
+        height = rectangles[:, 3] - rectangles[:, 2]
+        fits = (width > 0) & (height > 0) & (width >= min_width) & (height >= min_height)
+        return rectangles[fits], (width * height)[fits]
+
+    def sample_free_point(self, rng: np.random.Generator, max_attempts: int = 100):
+        """
+        Draws a point uniformly from the free space within the log, call find_free_rectangles first to update it.
+        Only points outside of the circle are rejected, hence this does not slow down as the log fills up.
+        :param rng: Random number generator of the search
+        :return: Tuple (x, y) or None if no point within the log was found
+        """
+        for _ in range(max_attempts):
+            x, y = self.free_space.sample_point(rng)
+            if self.check_if_point_in_log(x, y):
+                return x, y
+        return None
+
+    def fit_rectangles_in_log(self, x_0: np.ndarray, x_1: np.ndarray, y_0: np.ndarray, y_1: np.ndarray,
+                              levels: int = 9) -> tuple:
+        """
+        Finds a large rectangle within both the circle and each of the given rectangles.
+        For a vertical range [a, b] the horizontal range is limited by the chords at a and b, as the chord is shortest
+        at either end. All vertical ranges between a number of equally spaced levels are tried.
+        :param levels: Number of levels along the height of each rectangle
+        :return: x_0, x_1, y_0, y_1 arrays of the fitted rectangles
+        """
+        steps = np.linspace(0, 1, levels)
+        low = np.clip(y_0, 0, self.diameter)[:, None]
+        high = np.clip(y_1, 0, self.diameter)[:, None]
+        y = low + (high - low) * steps[None, :]
+        x_left, x_right = self.calculate_edge_positions_on_circle_array(y)
+
+        # Rectangles for every pair of levels a < b, indexed (rectangle, a, b)
+        left = np.maximum(x_0[:, None, None], np.maximum(x_left[:, :, None], x_left[:, None, :]))
+        right = np.minimum(x_1[:, None, None], np.minimum(x_right[:, :, None], x_right[:, None, :]))
+        heights = np.triu(y[:, None, :] - y[:, :, None], k=1)
+        areas = np.clip(right - left, 0, None) * heights
+
+        best = areas.reshape(len(areas), -1).argmax(axis=1)
+        a, b = np.unravel_index(best, (levels, levels))
+        rows = np.arange(len(areas))
+        return left[rows, a, b], right[rows, a, b], y[rows, a], y[rows, b]
+
+    def begin_transaction(self) -> None:
+        """
+        Starts recording all changes to the layout, so they can be committed or rolled back as a whole.
+        """
+        if self.journal is not None:
+            raise ValueError(f"Log {self.log_id} already has an open transaction")
+        self.journal = []
+
+    def commit_transaction(self) -> list:
+        """
+        Accepts all changes since begin_transaction
+        :return: The journal of changes that have been committed
+        """
+        journal = self.journal
+        self.journal = None
+        return journal
+
+    def rollback_transaction(self) -> None:
+        """
+        Undoes all changes since begin_transaction, only touching the shapes that have been changed.
+        """
+        journal = self.journal
+        self.journal = None
+        for change, shape, x, y in reversed(journal):
+            if change == "add":
+                self.remove_shape(shape)
+                shape.log = None
+            elif change == "remove":
+                shape.log = self
+                shape.set_location(x=x, y=y)
+                self.add_shape(shape)
+            elif change == "move":
+                self.move_shape(shape, x=x, y=y)
+
+    def get_changes(self, journal: list = None) -> LayoutChanges:
+        """
+        Nets the records of a journal out per shape. A shape that is added and removed again, or moved back to where it
+        was, has not changed.
+        :param journal: Journal of changes that lead to the current layout, the open transaction by default
+        """
+        if journal is None:
+            journal = self.journal
+        before = {}
+        changed_shapes = {}
+        for change, shape, x, y in journal:
+            if shape.shape_id not in changed_shapes:
+                changed_shapes[shape.shape_id] = shape
+                before[shape.shape_id] = None if change == "add" else \
+                    Footprint(shape.shape_id, x, y, shape.width, shape.height)
+
+        changes = LayoutChanges(added=[], removed=[], moved=[])
+        for s_id, shape in changed_shapes.items():
+            after = Footprint(s_id, shape.x, shape.y, shape.width, shape.height) if s_id in self.store.slot_of else None
+            if before[s_id] is None and after is not None:
+                changes.added.append(after)
+            elif before[s_id] is not None and after is None:
+                changes.removed.append(before[s_id])
+            elif before[s_id] != after:
+                changes.moved.append((before[s_id], after))
+        return changes
+
+    def calculate_sawdust_delta(self, changes: LayoutChanges) -> float:
+        """
+        Difference in sawdust caused by the changes, only the changed shapes and their neighbours are considered
+        :param changes: Changes that lead to the current layout, see get_changes
+        """
+        changed_ids = set([footprint.shape_id for footprint in changes.added + changes.removed]
+                          + [footprint.shape_id for footprint, _ in changes.moved])
+        return (self.calculate_sawdust_of_footprints(changes.added + [after for _, after in changes.moved], changed_ids)
+                - self.calculate_sawdust_of_footprints(changes.removed + [before for before, _ in changes.moved],
+                                                       changed_ids))
+
+    def calculate_sawdust_of_footprints(self, footprints: list, changed_ids: set) -> float:
+        """
+        Sawdust created by the footprints, minus the sawdust they share with each other and with the unchanged shapes
+        :param changed_ids: Ids of all changed shapes, their current location in the spatial index is not used
+        """
+        saw_dust = 0
+        for index, footprint in enumerate(footprints):
+            saw_dust += self.calculate_sawdust_of_shape(footprint)
+            neighbours = self.grid.query(x_0=footprint.x - self.saw_kerf,
+                                         x_1=footprint.x + footprint.width + self.saw_kerf,
+                                         y_0=footprint.y - self.saw_kerf,
+                                         y_1=footprint.y + footprint.height + self.saw_kerf)
+            saw_dust -= sum([calculate_sawdust_shared_between_shapes(footprint, neighbour, self.saw_kerf)
+                             for neighbour in neighbours if neighbour.shape_id not in changed_ids])
+            saw_dust -= sum([calculate_sawdust_shared_between_shapes(footprint, other, self.saw_kerf)
+                             for other in footprints[index + 1:]])
+        return saw_dust
+
+    def check_if_point_in_any_shape(self, x: float, y: float) -> bool:
+        return len(self.grid.query_point(x, y)) > 0
+
     def check_if_point_in_log(self, x: float, y: float) -> bool:
         if x < 0 or x > self.diameter:
             return False
@@ -210,30 +573,39 @@ class Log:
         y_edge = r + v_y / mag_v * r
         return x_edge, y_edge
 
+    def _update_min_space(self, min_space: float, distances: np.ndarray, x: float, y: float) -> float:
+        """
+        Lowers min_space to the closest of the given obstacle distances
+        :param x: x coordinate the distances were measured from (for logging)
+        :param y: y coordinate the distances were measured from (for logging)
+        """
+        if len(distances) > 0:
+            closest = float(distances.min())
+            if closest < min_space:
+                min_space = closest
+                if min_space < -constants.error_margin:
+                    logger.error(f"Min space is {min_space} from ({x}, {y}) in log {self.log_id}")
+                    raise ValueError
+        return min_space
+
     def find_shapes_closest_to_shape(self, c_shape: Shape, orientation: str) -> float:
         """
         :param c_shape: central shape (shape of which we consider the surrounding shapes)
         :param orientation: left, right, up, down
         :return:
         """
-        other_shapes = [s for s in self.shapes if s.shape_id != c_shape.shape_id]
+        sk = self.saw_kerf
+        x, y, w, h, active = self.store.columns()
+        others = active & (self.store.shape_id[:len(active)] != c_shape.shape_id)
         if orientation == "left":
             # Set log boundaries for the shape
             min_space_bot, _ = c_shape.log.calculate_edge_positions_on_circle(c_shape.y)
             min_space_top, _ = c_shape.log.calculate_edge_positions_on_circle((c_shape.y + c_shape.height))
             min_space = c_shape.x - max(min_space_bot, min_space_top)
-            other_shapes = [s for s in other_shapes if s.x + s.width + self.saw_kerf
-                            <= c_shape.x + constants.error_margin]
             # Check if shapes are on the same height, and whether the shape is on the left (direction of orientation)
-            for shape in other_shapes:
-                if not (shape.y + shape.height + self.saw_kerf <= c_shape.y or
-                        shape.y >= c_shape.y + c_shape.height + self.saw_kerf):
-                    if c_shape.x - (shape.x + shape.width + self.saw_kerf) < min_space:
-                        min_space = c_shape.x - (shape.x + shape.width + self.saw_kerf)
-                        if min_space < -constants.error_margin:
-                            logger.error(f"Min space is {min_space} with shape {shape.shape_id}: {shape.x},{shape.y}, "
-                                         f"cshape {c_shape.shape_id}:{c_shape.x}, {c_shape.y}")
-                            raise ValueError
+            mask = (others & (x + w + sk <= c_shape.x + constants.error_margin)
+                    & ~((y + h + sk <= c_shape.y) | (y >= c_shape.y + c_shape.height + sk)))
+            min_space = self._update_min_space(min_space, c_shape.x - (x[mask] + w[mask] + sk), c_shape.x, c_shape.y)
             # Check Log Boundaries
             min_x_left_top, _ = self.calculate_edge_positions_on_circle(c_shape.y + c_shape.height)
             min_x_left_bot, _ = self.calculate_edge_positions_on_circle(c_shape.y)
@@ -245,17 +617,10 @@ class Log:
             _, max_space_bot = c_shape.log.calculate_edge_positions_on_circle(c_shape.y)
             _, max_space_top = c_shape.log.calculate_edge_positions_on_circle((c_shape.y + c_shape.height))
             min_space = min(max_space_bot, max_space_top) - (c_shape.x + c_shape.width)
-            other_shapes = [s for s in other_shapes if s.x + constants.error_margin >=
-                            c_shape.x + c_shape.width + self.saw_kerf]
-            for shape in other_shapes:
-                if not (shape.y + shape.height + self.saw_kerf <= c_shape.y or
-                        shape.y >= c_shape.y + c_shape.height + self.saw_kerf):
-                    if shape.x - (c_shape.x + c_shape.width + self.saw_kerf) < min_space:
-                        min_space = shape.x - (c_shape.x + c_shape.width + self.saw_kerf)
-                        if min_space < -constants.error_margin:
-                            logger.error(f"Min space is {min_space} with shape {shape.shape_id}: {shape.x},{shape.y}, "
-                                         f"cshape {c_shape.shape_id}:{c_shape.x}, {c_shape.y}")
-                            raise ValueError
+            mask = (others & (x + constants.error_margin >= c_shape.x + c_shape.width + sk)
+                    & ~((y + h + sk <= c_shape.y) | (y >= c_shape.y + c_shape.height + sk)))
+            min_space = self._update_min_space(min_space, x[mask] - (c_shape.x + c_shape.width + sk),
+                                               c_shape.x, c_shape.y)
             # Check Log Boundaries
             _, max_x_right_top = self.calculate_edge_positions_on_circle(c_shape.y + c_shape.height)
             _, max_x_right_bot = self.calculate_edge_positions_on_circle(c_shape.y)
@@ -267,17 +632,10 @@ class Log:
             _, max_space_left = c_shape.log.calculate_edge_positions_on_circle(c_shape.x)
             _, max_space_right = c_shape.log.calculate_edge_positions_on_circle((c_shape.x + c_shape.width))
             min_space = min(max_space_left, max_space_right) - (c_shape.y + c_shape.height)
-            other_shapes = [s for s in other_shapes if s.y + constants.error_margin >=
-                            c_shape.y + c_shape.height + self.saw_kerf]
-            for shape in other_shapes:
-                if not (shape.x + shape.width + self.saw_kerf <= c_shape.x or
-                        shape.x >= c_shape.x + c_shape.width + self.saw_kerf):
-                    if shape.y - (c_shape.y + c_shape.height + self.saw_kerf) < min_space:
-                        min_space = shape.y - (c_shape.y + c_shape.height + self.saw_kerf)
-                        if min_space < -constants.error_margin:
-                            logger.error(f"Min space is {min_space} with shape {shape.shape_id}: {shape.x},{shape.y}, "
-                                         f"cshape {c_shape.shape_id}:{c_shape.x}, {c_shape.y}")
-                            raise ValueError
+            mask = (others & (y + constants.error_margin >= c_shape.y + c_shape.height + sk)
+                    & ~((x + w + sk <= c_shape.x) | (x >= c_shape.x + c_shape.width + sk)))
+            min_space = self._update_min_space(min_space, y[mask] - (c_shape.y + c_shape.height + sk),
+                                               c_shape.x, c_shape.y)
             # Check Log Boundaries
             _, max_y_top_left = self.calculate_edge_positions_on_circle(c_shape.x)
             _, max_y_top_right = self.calculate_edge_positions_on_circle(c_shape.x + c_shape.width)
@@ -291,17 +649,9 @@ class Log:
             min_space_left, _ = c_shape.log.calculate_edge_positions_on_circle(c_shape.x)
             min_space_right, _ = c_shape.log.calculate_edge_positions_on_circle((c_shape.x + c_shape.width))
             min_space = c_shape.y - max(min_space_left, min_space_right)
-            other_shapes = [s for s in other_shapes if s.y + s.height + self.saw_kerf <=
-                            c_shape.y + constants.error_margin]
-            for shape in other_shapes:
-                if not (shape.x + shape.width + self.saw_kerf <= c_shape.x or
-                        shape.x >= c_shape.x + c_shape.width + self.saw_kerf):
-                    if c_shape.y - (shape.y + shape.height + self.saw_kerf) < min_space:
-                        min_space = c_shape.y - (shape.y + shape.height + self.saw_kerf)
-                        if min_space < -constants.error_margin:
-                            logger.error(f"Min space is {min_space} with shape {shape.shape_id}: {shape.x},{shape.y}, "
-                                         f"cshape {c_shape.shape_id}:{c_shape.x}, {c_shape.y}")
-                            raise ValueError
+            mask = (others & (y + h + sk <= c_shape.y + constants.error_margin)
+                    & ~((x + w + sk <= c_shape.x) | (x >= c_shape.x + c_shape.width + sk)))
+            min_space = self._update_min_space(min_space, c_shape.y - (y[mask] + h[mask] + sk), c_shape.x, c_shape.y)
             # Check Log Boundaries
             min_y_bot_left, _ = self.calculate_edge_positions_on_circle(c_shape.x)
             min_y_bot_right, _ = self.calculate_edge_positions_on_circle(c_shape.x + c_shape.width)
@@ -323,22 +673,19 @@ class Log:
         :param orientation: left, right, up, down
         :return:
         """
-        for shape in self.shapes:
-            if shape.check_if_point_in_shape(x, y):
-                return 0
+        if self.check_if_point_in_any_shape(x, y):
+            return 0
 
+        sk = self.saw_kerf
+        s_x, s_y, s_w, s_h, active = self.store.columns()
         if orientation == "left":
             # Set log boundaries for the shape
             min_space, _ = self.calculate_edge_positions_on_circle(y)
             min_space = x - min_space
-            other_shapes = [s for s in self.shapes if s.x + s.width + self.saw_kerf <= x + constants.error_margin]
             # Check if shapes are on the same height, and whether the shape is on the left (direction of orientation)
-            for shape in other_shapes:
-                if not (shape.y + shape.height + self.saw_kerf <= y or shape.y >= y):
-                    if x - (shape.x + shape.width + self.saw_kerf) < min_space:
-                        min_space = x - (shape.x + shape.width + self.saw_kerf)
-                        if min_space < -constants.error_margin:
-                            raise ValueError
+            mask = (active & (s_x + s_w + sk <= x + constants.error_margin)
+                    & ~((s_y + s_h + sk <= y) | (s_y >= y)))
+            min_space = self._update_min_space(min_space, x - (s_x[mask] + s_w[mask] + sk), x, y)
             # Check Log Boundaries
             minimum_x_left, _ = self.calculate_edge_positions_on_circle(y)
             if x - minimum_x_left < min_space:
@@ -347,14 +694,9 @@ class Log:
         elif orientation == "right":
             _, max_space = self.calculate_edge_positions_on_circle(y)
             min_space = max_space - x
-            other_shapes = [s for s in self.shapes if s.x + constants.error_margin >= x]
-            for shape in other_shapes:
-                if not (shape.y + shape.height + self.saw_kerf <= y or
-                        shape.y >= y):
-                    if shape.x - x < min_space:
-                        min_space = shape.x - x
-                        if min_space < -constants.error_margin:
-                            raise ValueError
+            mask = (active & (s_x + constants.error_margin >= x)
+                    & ~((s_y + s_h + sk <= y) | (s_y >= y)))
+            min_space = self._update_min_space(min_space, s_x[mask] - x, x, y)
             # Check Log Boundaries
             _, maximum_x_right = self.calculate_edge_positions_on_circle(y)
             if maximum_x_right - x < min_space:
@@ -363,13 +705,9 @@ class Log:
         elif orientation == "up":
             _, max_space = self.calculate_edge_positions_on_circle(x)
             min_space = max_space - y
-            other_shapes = [s for s in self.shapes if s.y + constants.error_margin >= y]
-            for shape in other_shapes:
-                if not shape.x + shape.width + self.saw_kerf <= x or shape.x >= x:
-                    if shape.y - y < min_space:
-                        min_space = shape.y - y
-                        if min_space < -constants.error_margin:
-                            raise ValueError
+            mask = (active & (s_y + constants.error_margin >= y)
+                    & ~((s_x + s_w + sk <= x) | (s_x >= x)))
+            min_space = self._update_min_space(min_space, s_y[mask] - y, x, y)
             # Check Log Boundaries
             _, maximum_y_top = self.calculate_edge_positions_on_circle(x)
             if maximum_y_top - y < min_space:
@@ -380,14 +718,9 @@ class Log:
         elif orientation == "down":
             min_space, _ = self.calculate_edge_positions_on_circle(x)
             min_space = y - min_space
-            other_shapes = [s for s in self.shapes if s.y + s.height + self.saw_kerf <=
-                            y + constants.error_margin]
-            for shape in other_shapes:
-                if not shape.x + shape.width + self.saw_kerf <= x or shape.x >= x:
-                    if y - (shape.y + shape.height + self.saw_kerf) < min_space:
-                        min_space = y - (shape.y + shape.height + self.saw_kerf)
-                        if min_space < -constants.error_margin:
-                            raise ValueError
+            mask = (active & (s_y + s_h + sk <= y + constants.error_margin)
+                    & ~((s_x + s_w + sk <= x) | (s_x >= x)))
+            min_space = self._update_min_space(min_space, y - (s_y[mask] + s_h[mask] + sk), x, y)
             # Check Log Boundaries
             minimum_y_bot, _ = self.calculate_edge_positions_on_circle(x)
             if y - minimum_y_bot < min_space:
@@ -398,6 +731,52 @@ class Log:
             raise NotImplementedError(f"No orientation {orientation}")
         return min_space
 
+    def find_shapes_in_rectangle(self, x_0: float, x_1: float, y_0: float, y_1: float) -> list:
+        """
+        Returns all shapes of which the saw kerf zone intersects the rectangle [x_0, x_1] x [y_0, y_1]
+        """
+        return self.store.shapes_in_slots(self.store.find_in_rectangle(x_0, x_1, y_0, y_1, saw_kerf=self.saw_kerf))
+
+    def find_shapes_containing_point(self, x: float, y: float) -> list:
+        """
+        Returns all shapes of which the saw kerf zone contains the point (x, y)
+        """
+        return self.grid.query_point(x, y)
+
+    def find_free_box_around_point(self, x: float, y: float) -> tuple:
+        """
+        Expands from a point that is not covered by any shape until there is a collision with a shape (saw kerf)
+        or the log boundary, separately in the horizontal and vertical direction.
+        :return: left x, right x, lowest y, highest y
+        """
+        sk = self.saw_kerf
+        left_most_x, right_most_x = self.calculate_edge_positions_on_circle(y)
+        lowest_y, highest_y = self.calculate_edge_positions_on_circle(x)
+        s_x, s_y, s_w, s_h, active = self.store.columns()
+
+        # Shapes in the same x dimension can cause a y-collision
+        same_column = active & (s_x - sk <= x) & (x <= s_x + s_w + sk)
+        tops = s_y[same_column] + s_h[same_column] + sk
+        bottoms = s_y[same_column] - sk
+        tops = tops[(tops < y) & (tops > lowest_y)]
+        bottoms = bottoms[(bottoms > y) & (bottoms < highest_y)]
+        if len(tops) > 0:
+            lowest_y = float(tops.max())
+        if len(bottoms) > 0:
+            highest_y = float(bottoms.min())
+
+        # Shapes in the same y dimension can cause an x-collision
+        same_row = active & (s_y - sk <= y) & (y <= s_y + s_h + sk)
+        rights = s_x[same_row] + s_w[same_row] + sk
+        lefts = s_x[same_row] - sk
+        rights = rights[(rights < x) & (rights > left_most_x)]
+        lefts = lefts[(lefts > x) & (lefts < right_most_x)]
+        if len(rights) > 0:
+            left_most_x = float(rights.max())
+        if len(lefts) > 0:
+            right_most_x = float(lefts.min())
+        return left_most_x, right_most_x, lowest_y, highest_y
+
 
 def check_shapes_intersect(shape_a: Shape, shape_b: Shape, sk: float) -> bool:
     a_x_1 = shape_a.x
@@ -443,12 +822,12 @@ def calculate_sawdust_shared_between_shapes(shape_a, shape_b, saw_kerf=None) ->
             x_max = min(shape_a.x + shape_a.width + saw_kerf, shape_b.x + shape_b.width + saw_kerf)
             # The shared sawdust is the overlap in sawkerf, times the length of the overlap
             return (2 * saw_kerf - (shape_a.y - (shape_b.y + shape_b.height))) * (x_max - x_min)
-        elif 0 < shape_a.y + shape_a.height - shape_b.y <= 2 * saw_kerf:
+        elif 0 < shape_b.y - (shape_a.y + shape_a.height) <= 2 * saw_kerf:
             # Shape b is above shape a
             x_min = max(shape_a.x - saw_kerf, shape_b.x - saw_kerf)
             x_max = min(shape_a.x + shape_a.width + saw_kerf, shape_b.x + shape_b.width + saw_kerf)
             # The shared sawdust is the overlap in sawkerf, times the length of the overlap
-            return (2 * saw_kerf - (shape_a.y + shape_a.height - shape_b.y)) * (x_max - x_min)
+            return (2 * saw_kerf - (shape_b.y - (shape_a.y + shape_a.height))) * (x_max - x_min)
         else:
             # TODO: Check sawdust calculation for only corners overlapping
             return saw_kerf ** 2
@@ -456,21 +835,15 @@ def calculate_sawdust_shared_between_shapes(shape_a, shape_b, saw_kerf=None) ->
         return 0
 
 
-def select_random_shapes_from_log(log: Log, count: int = 1) -> Shape or list:
+def select_random_shapes_from_log(log: Log, rng: np.random.Generator, count: int = 1) -> Shape or list:
     """
-    Returns a random shape from a log.
+    Returns random shapes from a log, see Log.select_random_shapes.
     :param log:
-    :param count:
-    :return:
+    :param rng: Random number generator of the search
+    :param count: Number of distinct shapes to select
+    :return: A single Shape if count is 1, else a list of up to count shapes
     """
-    probabilities = []
-    total_distance = sum(
-        [math.sqrt((s.width - log.diameter) ** 2 + (s.height - log.diameter) ** 2) for s in log.shapes])
-
-    for shape in log.shapes:
-        probabilities.append(math.sqrt((shape.width - log.diameter) ** 2 +
-                                       (shape.height - log.diameter) ** 2) / total_distance)
+    shapes = log.select_random_shapes(count, rng)
     if count == 1:
-        return random.choices(log.shapes, weights=probabilities)[0]
-    else:
-        return np.random.choice(log.shapes, p=probabilities, replace=False)
+        return shapes[0] if len(shapes) > 0 else None
+    return shapes
@@ -1,4 +1,7 @@
+import multiprocessing
 import os
+import queue
+import threading
 if not os.path.exists("logs"):
     os.makedirs("logs")
 
@@ -26,7 +29,12 @@ def gui_throw_basic_message(title, text):
     tk.Label(error_window, text=text, padx=300, pady=300).pack()
 
 
-def attempt_run_ALNS(list_of_logs: list, list_of_shape_types: list, temp_input, ite_input) -> tuple | None:
+def attempt_run_ALNS(list_of_logs: list, list_of_shape_types: list, temp_input, ite_input) -> None:
+    global optimisation_thread
+    if optimisation_thread is not None and optimisation_thread.is_alive():
+        gui_throw_basic_message(title="Optimisation Running", text="Wait for the current optimisation to finish")
+        return
+
     try:
         temp = int(temp_input.get())
         if temp <= 0:
@@ -96,45 +104,83 @@ def attempt_run_ALNS(list_of_logs: list, list_of_shape_types: list, temp_input,
 
     root.update()
 
-    t_0 = time.perf_counter()
-    solution_quality_df, method_df = apply_ALNS(list_of_logs, list_of_shape_types, progress_label)
-    t_1 = time.perf_counter()
-    status_window.title("Optimisation Finished!")
-    progress_label.config(text=f"Completed Optimisation Procedure in{(t_1 - t_0) / 60: 0.2f} Minutes!")
+    # The optimisation runs in a background thread, the window polls its progress events at a fixed rate
+    progress_queue = queue.Queue()
+    optimisation_thread = threading.Thread(target=apply_ALNS, args=(list_of_logs, list_of_shape_types, progress_queue),
+                                           daemon=True)
+    optimisation_thread.start()
+    root.after(constants.gui_poll_interval, lambda: gui_poll_progress(list_of_logs, progress_queue, status_window,
+                                                                      progress_label, time.perf_counter(), []))
+
+
+def apply_ALNS(list_of_logs: list, list_of_shape_types: list, progress_queue: queue.Queue) -> None:
+    """
+    Runs in the background thread, hence it must not touch any tkinter object. All progress and the final result
+    ("done", dataframes) or ("error", exception) are sent over the queue.
+    """
+    try:
+        progress_queue.put(("status", "Creating Initial Solution..."))
+        list_of_shape_types.extend(ALNS_tools.create_transposed_shape_types(list_of_shape_types))
 
-    return solution_quality_df, method_df
+        ALNS.greedy_place(all_shapes=[],
+                          logs=list_of_logs,
+                          shape_types=list_of_shape_types)
 
+        progress_queue.put(("status", "Established Initial Solution..."))
 
-def apply_ALNS(list_of_logs: list, list_of_shape_types: list, progress_label: tk.Label) -> tuple:
-    global root
-    transposed_shapes = []
+        solution_quality_df, method_df, parameter_df = ALNS.run_ALNS(logs=list_of_logs,
+                                                                     shape_types=list_of_shape_types,
+                                                                     progress_queue=progress_queue)
 
-    progress_label.config(text=progress_label.cget("text") + " \n Creating Initial Solution...")
-    root.update()
+        ALNS_tools.check_feasibility(list_of_logs=list_of_logs)
+        progress_queue.put(("done", (solution_quality_df, method_df, parameter_df)))
+    except Exception as e:
+        progress_queue.put(("error", e))
+        raise
 
-    for shape in shape_types:
-        if shape.width != shape.height:
-            transposed_shapes.append(ShapeType(width=shape.height,
-                                               height=shape.width,
-                                               ratio=shape.width / shape.height,
-                                               demand=shape.demand,
-                                               colour=shape.colour,
-                                               duplicate_id=shape.type_id))
-    shape_types.extend(transposed_shapes)
-
-    ALNS.greedy_place(all_shapes=[],
-                      logs=list_of_logs,
-                      shape_types=list_of_shape_types)
-
-    progress_label.config(text=progress_label.cget("text") + " \n Established Initial Solution...")
-    root.update()
 
-    solution_quality_df, method_df, parameter_df = ALNS.run_ALNS(logs=list_of_logs,
-                                                                 shape_types=list_of_shape_types,
-                                                                 root=root, progress_label=progress_label)
+def gui_poll_progress(list_of_logs: list, progress_queue: queue.Queue, status_window: tk.Toplevel,
+                      progress_label: tk.Label, t_0: float, status: list) -> None:
+    """
+    Shows the latest progress event of the optimisation, and its results once it has finished
+    :param status: Status messages received so far
+    """
+    progress = None
+    while True:
+        try:
+            event, value = progress_queue.get_nowait()
+        except queue.Empty:
+            break
+
+        if event == "status":
+            status.append(value)
+        elif event == "progress":
+            progress = value
+        elif event == "error":
+            status_window.title("Optimisation Failed!")
+            progress_label.config(text=f"Optimisation failed: {value}")
+            return
+        elif event == "done":
+            t_1 = time.perf_counter()
+            status_window.title("Optimisation Finished!")
+            progress_label.config(text=f"Completed Optimisation Procedure in{(t_1 - t_0) / 60: 0.2f} Minutes!")
+            show_results(list_of_logs, *value)
+            return
 
-    ALNS_tools.check_feasibility(list_of_logs=list_of_logs)
+    if progress is not None:
+        efficiencies = ", ".join([f"{log_id}: {efficiency:.2f}"
+                                  for log_id, efficiency in progress["efficiency"].items()])
+        progress_label.config(text=constants.optimising_text + "\n".join(status)
+                              + f"\nIteration {progress['iteration']} out of {progress['iterations']}"
+                              + f"\nTemperature {progress['temperature']:.2f}"
+                              + f"\nUsage per log - {efficiencies}")
+    elif len(status) > 0:
+        progress_label.config(text=constants.optimising_text + "\n".join(status))
+    root.after(constants.gui_poll_interval, lambda: gui_poll_progress(list_of_logs, progress_queue, status_window,
+                                                                      progress_label, t_0, status))
 
+
+def show_results(list_of_logs: list, solution_quality_df, method_df, parameter_df) -> None:
     for log in list_of_logs:
         log.show_plot()
         log.save_log_plot()
@@ -143,8 +189,6 @@ def apply_ALNS(list_of_logs: list, list_of_shape_types: list, progress_label: tk
     ALNS_tools.plot_method_data(method_df)
     ALNS_tools.plot_parameter_data(parameter_df)
 
-    return solution_quality_df, method_df
-
 
 def gui_add_input_log(frame):
     global logs
@@ -219,17 +263,21 @@ def gui_remove_shape(shape):
 
 logs = []
 shape_types = []
+optimisation_thread = None
 
-root = tk.Tk()
-root.title("Sawmill Optimiser")
-root.geometry("1200x900")
-if os.path.exists("saw.ico"):
-    root.iconbitmap("saw.ico")
+if __name__ == '__main__':
+    # Worker processes in the frozen executable, which re-import this module, must not reach any of the GUI below
+    multiprocessing.freeze_support()
 
-if not os.path.exists("plots"):
-    os.makedirs("plots")
+    root = tk.Tk()
+    root.title("Sawmill Optimiser")
+    root.geometry("1200x900")
+    if os.path.exists("saw.ico"):
+        root.iconbitmap("saw.ico")
+
+    if not os.path.exists("plots"):
+        os.makedirs("plots")
 
-if __name__ == '__main__':
     """
     Import Shape Data
     """
@@ -0,0 +1,102 @@
+import numpy as np
+
+
+class ShapeStore:
+    """
+    Struct-of-arrays storage for the shapes placed in a log.
+    Every shape occupies a slot; the columns hold the geometry of the shape in that slot, so geometric predicates
+    can be evaluated as vectorised masks over all placed shapes at once. Freed slots are re-used.
+    """
+    initial_capacity = 64
+
+    def __init__(self, capacity: int = initial_capacity):
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.width = np.zeros(capacity)
+        self.height = np.zeros(capacity)
+        self.type_id = np.full(capacity, -1, dtype=np.int64)
+        self.shape_id = np.full(capacity, -1, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+
+        self.slot_shapes = [None] * capacity
+        self.slot_of = {}
+        self.free_slots = []
+        # Slots beyond size have never been used
+        self.size = 0
+        self._view = None
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self.x)
+        for column in ["x", "y", "width", "height", "type_id", "shape_id", "active"]:
+            old = getattr(self, column)
+            new = np.full(capacity, -1, dtype=old.dtype) if old.dtype == np.int64 else np.zeros(capacity, old.dtype)
+            new[:len(old)] = old
+            setattr(self, column, new)
+        self.slot_shapes.extend([None] * (capacity - len(self.slot_shapes)))
+
+    def view(self) -> tuple:
+        """
+        Returns the placed Shape objects in slot order. The view is cached until the next insertion or removal.
+        """
+        if self._view is None:
+            self._view = tuple([self.slot_shapes[slot] for slot in np.flatnonzero(self.active[:self.size])])
+        return self._view
+
+    def insert(self, shape) -> int:
+        if len(self.free_slots) > 0:
+            slot = self.free_slots.pop()
+        else:
+            if self.size == len(self.x):
+                self._grow()
+            slot = self.size
+            self.size += 1
+        self.slot_shapes[slot] = shape
+        self.slot_of[shape.shape_id] = slot
+        self.type_id[slot] = shape.type.type_id
+        self.shape_id[slot] = shape.shape_id
+        self.active[slot] = True
+        self.update(shape)
+        self._view = None
+        return slot
+
+    def remove(self, shape) -> int:
+        slot = self.slot_of.pop(shape.shape_id)
+        self.slot_shapes[slot] = None
+        self.shape_id[slot] = -1
+        self.type_id[slot] = -1
+        self.active[slot] = False
+        self.free_slots.append(slot)
+        self._view = None
+        return slot
+
+    def update(self, shape) -> None:
+        """
+        Copies the current location and dimensions of the shape into its slot
+        """
+        slot = self.slot_of[shape.shape_id]
+        self.x[slot] = shape.x
+        self.y[slot] = shape.y
+        self.width[slot] = shape.width
+        self.height[slot] = shape.height
+
+    def columns(self) -> tuple:
+        """
+        :return: x, y, width, height and active columns, truncated to the slots in use
+        """
+        n = self.size
+        return self.x[:n], self.y[:n], self.width[:n], self.height[:n], self.active[:n]
+
+    def shapes_in_slots(self, slots) -> list:
+        return [self.slot_shapes[slot] for slot in slots]
+
+    def find_in_rectangle(self, x_0: float, x_1: float, y_0: float, y_1: float, saw_kerf: float) -> np.ndarray:
+        """
+        :return: Slots of all shapes of which the saw kerf zone intersects the (closed) rectangle
+        """
+        x, y, w, h, active = self.columns()
+        mask = active & (x - saw_kerf <= x_1) & (x + w + saw_kerf >= x_0) \
+            & (y - saw_kerf <= y_1) & (y + h + saw_kerf >= y_0)
+        return np.flatnonzero(mask)
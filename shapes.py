@@ -70,13 +70,32 @@ class ShapeType:
     def __str__(self):
         return f"ID: {self.type_id}, h: {self.height}, w: {self.width}"
 
+    def to_descriptor(self) -> tuple:
+        """
+        :return: Picklable description of the shape type, without any of its widgets
+        """
+        return self.type_id, self.width, self.height, self.ratio, self.demand, self.colour, self.duplicate_id
+
+    @classmethod
+    def from_descriptor(cls, descriptor: tuple):
+        type_id, width, height, ratio, demand, colour, duplicate_id = descriptor
+        shape_type = cls(width=width, height=height, ratio=ratio, demand=demand, colour=colour,
+                         duplicate_id=duplicate_id)
+        shape_type.type_id = type_id
+        return shape_type
+
 
 class Shape:
+    """
+    A placed (or to be placed) piece. Dimensions and colour are read from its ShapeType, which is shared by all
+    pieces of that type; plot artists are kept by the log that draws the piece.
+    """
+    __slots__ = ("shape_id", "type", "x", "y", "log", "placed", "rotated")
+
     def __init__(self, shape_type: ShapeType, x=None, y=None, copy_id: int = None):
         global shape_id
         """
-        :param width:
-        :param height:
+        :param shape_type: Type of the shape, defining its dimensions
         :param x: x coordinate of bottom left corner of figure
         :param y: y coordinate of bottom left corner of figure
         :param copy_id: Allows you to set the id of a shape to allow consistency across duplicated logs
@@ -87,20 +106,31 @@ class Shape:
         else:
             self.shape_id = copy_id
         self.type = shape_type
-        self.width = shape_type.width
-        self.height = shape_type.height
-        self.ratio = shape_type.ratio
         self.x = x
         self.y = y
         self.log = None
-        self.colour = shape_type.colour
         self.placed = False
-        self.rect = None
-        self.rect_kerf = None
-        self.text = None
+        # Rotated shapes swap the width and height of their type
+        self.rotated = False
 
         #  logger.debug(f"Created Shape {self.shape_id} at ({self.x}, {self.y})")
 
+    @property
+    def width(self) -> float:
+        return self.type.height if self.rotated else self.type.width
+
+    @property
+    def height(self) -> float:
+        return self.type.width if self.rotated else self.type.height
+
+    @property
+    def ratio(self) -> float:
+        return 1 / self.type.ratio if self.rotated else self.type.ratio
+
+    @property
+    def colour(self) -> str:
+        return self.type.colour
+
     def __str__(self):
         if self.x is not None and self.y is not None:
             return (f"Shape {self.shape_id} - at ({self.x}, {self.y}) in log {self.log.log_id}, "
@@ -125,9 +155,7 @@ class Shape:
         """
         if self.x is not None:
             self.x = self.x - self.height
-        width = self.width
-        self.width = self.height
-        self.height = width
+        self.rotated = not self.rotated
 
     def rotate_right(self) -> None:
         """
@@ -135,11 +163,13 @@ class Shape:
         Both x and y stay the same
         :return:
         """
-        width = self.width
-        self.width = self.height
-        self.height = width
+        self.rotated = not self.rotated
 
     def add_rect_to_plot(self) -> list or None:
+        """
+        Draws the shape in the figure of its log
+        :return: List of the created artists, to be kept by the log
+        """
         if self.log is None:
             print("Piece not attributed to log, not able to show figure")
             return None
@@ -152,37 +182,50 @@ class Shape:
             return
 
         if self.colour is not None:
-            self.rect = mpatches.Rectangle((self.x, self.y),
-                                           self.width, self.height,
-                                           facecolor=(mcolors.to_rgb(self.colour) + (0.5,)))
+            rect = mpatches.Rectangle((self.x, self.y),
+                                      self.width, self.height,
+                                      facecolor=(mcolors.to_rgb(self.colour) + (0.5,)))
         else:
-            self.rect = mpatches.Rectangle((self.x, self.y),
-                                           self.width, self.height,
-                                           facecolor=(0, 1, 0, 0.5))
-
-        self.rect_kerf = mpatches.Rectangle((self.x - self.log.saw_kerf,
-                                             self.y - self.log.saw_kerf),
-                                            self.width + 2 * self.log.saw_kerf,
-                                            self.height + 2 * self.log.saw_kerf,
-                                            color="black")
-        self.log.ax.add_patch(self.rect_kerf)
-        self.log.ax.add_patch(self.rect)
+            rect = mpatches.Rectangle((self.x, self.y),
+                                      self.width, self.height,
+                                      facecolor=(0, 1, 0, 0.5))
+
+        rect_kerf = mpatches.Rectangle((self.x - self.log.saw_kerf,
+                                        self.y - self.log.saw_kerf),
+                                       self.width + 2 * self.log.saw_kerf,
+                                       self.height + 2 * self.log.saw_kerf,
+                                       color="black")
+        self.log.ax.add_patch(rect_kerf)
+        self.log.ax.add_patch(rect)
 
         if self.width > self.height:
-            self.text = self.log.ax.text(self.x + constants.rect_text_margin * self.width,
-                                         self.y + constants.rect_text_margin * self.height,
-                                         r"$\bf{{{i}}}$".format(i=self.shape_id) + f":{self.width}x{self.height}",
-                                         color="white", fontsize="small")
+            text = self.log.ax.text(self.x + constants.rect_text_margin * self.width,
+                                    self.y + constants.rect_text_margin * self.height,
+                                    r"$\bf{{{i}}}$".format(i=self.shape_id) + f":{self.width}x{self.height}",
+                                    color="white", fontsize="small")
         else:
-            self.text = self.log.ax.text(self.x + constants.rect_text_margin * self.width,
-                                         self.y + constants.rect_text_margin * self.height,
-                                         r"$\bf{{{i}}}$".format(i=self.shape_id) + f":\n{self.width}x\n{self.height}",
-                                         color="white", fontsize="small")
-        return [self.rect, self.rect_kerf, self.text]
+            text = self.log.ax.text(self.x + constants.rect_text_margin * self.width,
+                                    self.y + constants.rect_text_margin * self.height,
+                                    r"$\bf{{{i}}}$".format(i=self.shape_id) + f":\n{self.width}x\n{self.height}",
+                                    color="white", fontsize="small")
+        return [rect, rect_kerf, text]
 
     def get_volume(self) -> float:
         return self.width * self.height
 
+    def to_descriptor(self) -> tuple:
+        """
+        :return: Picklable description of the shape, referring to its shape type by id
+        """
+        return self.shape_id, self.type.type_id, self.x, self.y, self.rotated
+
+    @classmethod
+    def from_descriptor(cls, descriptor: tuple, shape_types: list):
+        copy_id, type_id, x, y, rotated = descriptor
+        shape = cls(shape_type=shape_types[type_id], x=x, y=y, copy_id=copy_id)
+        shape.rotated = rotated
+        return shape
+
     def assign_to_log(self, log):
         self.log = log
         self.log.add_shape(self)
@@ -229,6 +272,18 @@ class Shape:
             return False
 
 
+def get_next_shape_id() -> int:
+    return shape_id
+
+
+def set_next_shape_id(next_id: int) -> None:
+    """
+    Sets the id of the next created shape, e.g. to give shapes created in different processes disjoint ids
+    """
+    global shape_id
+    shape_id = next_id
+
+
 def sort_shapes_on_size(shapes):
     """
     :param shapes: List of Shapes
@@ -0,0 +1,47 @@
+import threading
+import time
+
+from logs import Log
+
+
+class LayoutSnapshot:
+    """
+    Thread safe copy of the best layout found so far of every log, kept up to date by run_ALNS while it runs, such
+    that a cutting plan can be taken at any moment. As only improving solutions are accepted, the best layout of a log
+    is its last accepted one. Layouts are stored as log descriptors.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.layouts = {}
+        self.efficiencies = {}
+        self.iteration = 0
+        self.updated = None
+        # Reason the search stopped, None while it is running
+        self.stop_reason = None
+
+    def update(self, logs: list, iteration: int) -> None:
+        """
+        :param logs: Logs of which the current layout is accepted, i.e. without an open transaction
+        :param iteration: Current iteration of the search
+        """
+        descriptors = [log.to_descriptor() for log in logs]
+        with self.lock:
+            for log, descriptor in zip(logs, descriptors):
+                self.layouts[log.log_id] = descriptor
+                self.efficiencies[log.log_id] = log.efficiency
+            self.iteration = iteration
+            self.updated = time.time()
+
+    def get_layouts(self) -> dict:
+        """
+        :return: Log descriptors by log id
+        """
+        with self.lock:
+            return dict(self.layouts)
+
+    def get_logs(self, shape_types: list) -> list:
+        """
+        :return: Copies of the logs with their best layout so far
+        """
+        return [Log.from_descriptor(descriptor, shape_types) for descriptor in self.get_layouts().values()]
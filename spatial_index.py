@@ -0,0 +1,89 @@
+import math
+
+
+class SpatialGrid:
+    """
+    Uniform grid over the bounding square of a log.
+    Every shape is registered in each cell its saw kerf zone overlaps, so neighbour and collision queries only
+    have to consider the shapes stored in the cells covered by the query rectangle.
+    """
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size if cell_size > 0 else 1
+        self.cells = {}
+        self.shapes = {}
+        self.boxes = {}
+        self.shape_cells = {}
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    def _cell_range(self, z_0: float, z_1: float) -> range:
+        return range(math.floor(z_0 / self.cell_size), math.floor(z_1 / self.cell_size) + 1)
+
+    def insert(self, shape, saw_kerf: float) -> None:
+        """
+        :param shape: Shape to register, the saw kerf zone around the shape is registered as well
+        :param saw_kerf: Saw kerf of the log the shape is placed in
+        """
+        box = (shape.x - saw_kerf, shape.x + shape.width + saw_kerf,
+               shape.y - saw_kerf, shape.y + shape.height + saw_kerf)
+        keys = [(i, j) for i in self._cell_range(box[0], box[1]) for j in self._cell_range(box[2], box[3])]
+        for key in keys:
+            self.cells.setdefault(key, {})[shape.shape_id] = shape
+        self.shapes[shape.shape_id] = shape
+        self.boxes[shape.shape_id] = box
+        self.shape_cells[shape.shape_id] = keys
+
+    def remove(self, shape) -> None:
+        for key in self.shape_cells.pop(shape.shape_id, []):
+            cell = self.cells[key]
+            del cell[shape.shape_id]
+            if len(cell) == 0:
+                del self.cells[key]
+        self.shapes.pop(shape.shape_id, None)
+        self.boxes.pop(shape.shape_id, None)
+
+    def move(self, shape, saw_kerf: float) -> None:
+        self.remove(shape)
+        self.insert(shape, saw_kerf)
+
+    def query(self, x_0: float, x_1: float, y_0: float, y_1: float) -> list:
+        """
+        Returns all shapes of which the saw kerf zone intersects the (closed) rectangle [x_0, x_1] x [y_0, y_1]
+        """
+        x_0, x_1 = min(x_0, x_1), max(x_0, x_1)
+        y_0, y_1 = min(y_0, y_1), max(y_0, y_1)
+        x_cells = self._cell_range(x_0, x_1)
+        y_cells = self._cell_range(y_0, y_1)
+
+        # Large queries are cheaper by checking every registered shape directly
+        if len(x_cells) * len(y_cells) > len(self.shapes):
+            candidates = self.shapes
+        else:
+            candidates = {}
+            for i in x_cells:
+                for j in y_cells:
+                    cell = self.cells.get((i, j))
+                    if cell is not None:
+                        candidates.update(cell)
+
+        found = []
+        for s_id, shape in candidates.items():
+            b_x_0, b_x_1, b_y_0, b_y_1 = self.boxes[s_id]
+            if b_x_0 <= x_1 and b_x_1 >= x_0 and b_y_0 <= y_1 and b_y_1 >= y_0:
+                found.append(shape)
+        return found
+
+    def query_point(self, x: float, y: float) -> list:
+        """
+        Returns all shapes of which the saw kerf zone contains the point (x, y)
+        """
+        cell = self.cells.get((math.floor(x / self.cell_size), math.floor(y / self.cell_size)))
+        if cell is None:
+            return []
+        found = []
+        for s_id, shape in cell.items():
+            b_x_0, b_x_1, b_y_0, b_y_1 = self.boxes[s_id]
+            if b_x_0 <= x <= b_x_1 and b_y_0 <= y <= b_y_1:
+                found.append(shape)
+        return found
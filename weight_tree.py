@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class WeightTree:
+    """
+    Fenwick (binary indexed) tree over non-negative weights. Weights can be updated and an index can be sampled
+    proportional to its weight in O(log n).
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.values = [0.0] * capacity
+        self.tree = [0.0] * (capacity + 1)
+        self.total = 0.0
+
+    def _rebuild(self) -> None:
+        tree = [0.0] + self.values
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.total = sum(self.values)
+
+    def set(self, index: int, weight: float) -> None:
+        if index >= len(self.values):
+            self.values.extend([0.0] * max(len(self.values), index + 1 - len(self.values)))
+            self.values[index] = weight
+            self._rebuild()
+            return
+
+        delta = weight - self.values[index]
+        self.values[index] = weight
+        self.total += delta
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, value: float) -> int:
+        """
+        :return: The first index of which the cumulative weight exceeds the value
+        """
+        index = 0
+        step = 1 << (len(self.values).bit_length() - 1)
+        while step > 0:
+            next_index = index + step
+            if next_index < len(self.tree) and self.tree[next_index] <= value:
+                index = next_index
+                value -= self.tree[next_index]
+            step >>= 1
+        return index
+
+    def sample(self, rng: np.random.Generator) -> int or None:
+        """
+        :param rng: Random number generator of the search
+        :return: Index sampled proportional to its weight, or None if all weights are zero
+        """
+        if self.total <= 0:
+            return None
+        index = self.find(rng.random() * self.total)
+        if index >= len(self.values) or self.values[index] <= 0:
+            # Rounding in the cumulative weights can point at an empty index, fall back to a full search
+            values = np.array(self.values)
+            self.total = values.sum()
+            if self.total <= 0:
+                return None
+            return int(rng.choice(len(values), p=values / self.total))
+        return index
+
+    def sample_without_replacement(self, count: int, rng: np.random.Generator) -> list:
+        """
+        :return: Up to count distinct indices, each sampled proportional to its weight among the remaining ones
+        """
+        picked = []
+        for _ in range(count):
+            index = self.sample(rng)
+            if index is None:
+                break
+            picked.append((index, self.values[index]))
+            self.set(index, 0.0)
+        for index, weight in picked:
+            self.set(index, weight)
+        return [index for index, _ in picked]